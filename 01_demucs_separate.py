@@ -22,132 +22,389 @@ Output:
     /kaggle/working/output/no_vocals.wav     - Instrumental stem (karaoke backing track)
 """
 
+import errno
+import gc
+import hashlib
+import importlib.util
 import os
+import shutil
 import subprocess
 import sys
+import time
 
 # --- CONFIG -------------------------------------------------------------------
 INPUT_FILE  = "/kaggle/working/song.mp3"   # <- change this
 OUTPUT_DIR  = "/kaggle/working/output"
 # ------------------------------------------------------------------------------
+CONFIG_KEYS = ("INPUT_FILE", "OUTPUT_DIR")   # what main(**overrides) may set
+
+# BS-Roformer (MDXC) inference params; overlap is audio-separator's integer
+# overlap factor, not a fraction
+MDXC_PARAMS = {
+    "segment_size":                 256,
+    "override_model_segment_size":  False,
+    "batch_size":                   4,
+    "overlap":                      8,
+    "pitch_shift":                  0,
+}
+
+
+def pip_install(*packages, check=True):
+    """Install with uv (parallel resolve/download); falls back to plain pip."""
+    if subprocess.run([sys.executable, "-m", "uv", "--version"], capture_output=True).returncode != 0:
+        subprocess.run([sys.executable, "-m", "pip", "install", "uv", "-q"], check=False)
+    r = subprocess.run(
+        [sys.executable, "-m", "uv", "pip", "install", "--python", sys.executable, "-q", *packages]
+    )
+    if r.returncode == 0:
+        return r
+    return subprocess.run([sys.executable, "-m", "pip", "install", *packages, "-q"], check=check)
+
+
+def importable(*modules):
+    """True if every module is already installed (lets install_deps skip pip entirely)."""
+    return all(importlib.util.find_spec(m) is not None for m in modules)
 
 
 def install_deps():
+    if importable("audio_separator") and shutil.which("ffmpeg"):
+        return
     print("Installing python-audio-separator...")
-    subprocess.run(
-        [sys.executable, "-m", "pip", "install", "audio-separator[gpu]", "-q"],
-        check=False  # gpu extras may warn; non-fatal
-    )
+    pip_install("audio-separator[gpu]", check=False)  # gpu extras may warn; non-fatal
     # Ensure ffmpeg available
     subprocess.run(["apt-get", "install", "-y", "-q", "ffmpeg"], check=False)
 
 
+class _WindowDataset:
+    """Map-style dataset of overlapping fixed-size windows over a (channels, samples) tensor."""
+
+    def __init__(self, mix, chunk_size, step):
+        self.mix = mix
+        self.chunk_size = chunk_size
+        self.step = step
+
+    def __len__(self):
+        return (self.mix.shape[-1] - self.chunk_size) // self.step + 1
+
+    def __getitem__(self, i):
+        start = i * self.step
+        return start, self.mix[:, start:start + self.chunk_size]
+
+
+def demix_batched(model, mix, chunk_size, num_overlap, batch_size, device, autocast=False):
+    """
+    Sliding-window inference over `mix` (channels, samples), running
+    `batch_size` windows per forward pass instead of one at a time.
+    Windows are overlap-added with a Hamming window to avoid seams.
+    Returns a (stems, channels, samples) float32 tensor on CPU.
+    """
+    import torch
+    import torch.nn.functional as F
+    from torch.utils.data import DataLoader
+
+    n_samples = mix.shape[-1]
+    step = max(1, chunk_size // num_overlap)
+    n_windows = -(-max(0, n_samples - chunk_size) // step) + 1
+    padded_len = (n_windows - 1) * step + chunk_size
+    mix = F.pad(mix, (0, padded_len - n_samples))
+
+    window = torch.hamming_window(chunk_size, periodic=False)
+    weight = torch.zeros(padded_len)
+    result = None
+    loader = DataLoader(
+        _WindowDataset(mix, chunk_size, step),
+        batch_size=batch_size, pin_memory=torch.device(device).type != "cpu",
+    )
+    with torch.inference_mode(), torch.autocast(
+        device_type=torch.device(device).type, dtype=torch.float16, enabled=autocast
+    ):
+        for starts, parts in loader:
+            out = model(parts.to(device, non_blocking=True)).float().cpu()
+            if out.dim() == 3:   # single-stem models drop the stem axis
+                out = out.unsqueeze(1)
+            if result is None:
+                result = torch.zeros(out.shape[1:-1] + (padded_len,))
+            for start, part_out in zip(starts.tolist(), out):
+                result[..., start:start + chunk_size] += part_out * window
+                weight[start:start + chunk_size] += window
+
+    return (result / weight)[..., :n_samples]
+
+
+def _patch_batched_roformer(sep, autocast):
+    """
+    Replace audio-separator's one-window-at-a-time Roformer demix with
+    demix_batched. No-op (returns False) if the internals aren't there.
+    Pitch-shifted runs go through the original demix.
+    """
+    inst = getattr(sep, "model_instance", None)
+    if not getattr(inst, "is_roformer", False) or not hasattr(inst, "model_run"):
+        return False
+    cfg = inst.model_data_cfgdict
+    original_demix = inst.demix
+
+    def demix(mix, override_model_segment_size=None):
+        import torch
+
+        if getattr(inst, "pitch_shift", 0):
+            if override_model_segment_size is None:   # older demix(mix) signature
+                return original_demix(mix)
+            return original_demix(mix, override_model_segment_size=override_model_segment_size)
+
+        # Same window length as upstream: stft_hop_length * (dim_t - 1), with
+        # dim_t replaced by segment_size when the override is on
+        if override_model_segment_size is None:
+            override_model_segment_size = getattr(inst, "override_model_segment_size", False)
+        dim_t = inst.segment_size if override_model_segment_size else cfg.inference.dim_t
+        hop_length = getattr(cfg.model, "stft_hop_length", None) or cfg.audio.hop_length
+
+        sources = demix_batched(
+            inst.model_run, torch.as_tensor(mix, dtype=torch.float32),
+            chunk_size=int(hop_length) * (int(dim_t) - 1),
+            num_overlap=MDXC_PARAMS["overlap"],
+            batch_size=MDXC_PARAMS["batch_size"],
+            device=inst.torch_device,
+            autocast=autocast,
+        )
+        sources = sources.numpy()
+        target = cfg.training.target_instrument
+        if not target:
+            return {k: v for k, v in zip(cfg.training.instruments, sources)}
+
+        # Single-target checkpoints (ep_317 included) predict one stem; like
+        # upstream, the other stem is the residual of the original mix
+        primary = sources[0]
+        if primary.shape[1] != mix.shape[1]:
+            from audio_separator.separator.uvr_lib_v5 import spec_utils
+            primary = spec_utils.match_array_shapes(primary, mix)
+        return {target: primary, inst.secondary_stem_name: mix - primary}
+
+    inst.demix = demix
+    return True
+
+
 def separate_bs_roformer(input_file, output_dir):
     """
     Separate vocals using BS-Roformer ViperX 1296 (MDX-Net architecture).
     Best vocal SDR benchmark as of 2025. ~2-4GB VRAM on T4/P100.
+    Runs with fp16 autocast (~2x faster, less VRAM); STFT stays fp32.
+    Sliding windows are batched (MDXC_PARAMS["batch_size"]) per forward pass.
     """
+    import torch
     from audio_separator.separator import Separator
 
     os.makedirs(output_dir, exist_ok=True)
     print(f"Separating: {input_file} -> {output_dir} using BS-Roformer ViperX 1296")
 
-    sep = Separator(
+    sep_kwargs = dict(
         output_dir=output_dir,
         output_format="WAV",
         normalization_threshold=0.9,
         output_single_stem=None,   # output both stems
     )
+    try:
+        sep = Separator(**sep_kwargs, use_autocast=True, mdxc_params=MDXC_PARAMS)
+        native_autocast = True
+    except TypeError:
+        # Older audio-separator without use_autocast/mdxc_params kwargs
+        sep = Separator(**sep_kwargs)
+        native_autocast = False
 
     # Load best-in-class vocal model
     sep.load_model(model_filename="model_bs_roformer_ep_317_sdr_12.9755.ckpt")
-    output_files = sep.separate(input_file)
+    if _patch_batched_roformer(sep, autocast=torch.cuda.is_available()):
+        print(f"  Batched Roformer inference: {MDXC_PARAMS['batch_size']} windows/pass")
+    if native_autocast or not torch.cuda.is_available():
+        output_files = sep.separate(input_file)
+    else:
+        print("  audio-separator lacks use_autocast; wrapping separation in torch.autocast")
+        with torch.autocast(device_type="cuda", dtype=torch.float16):
+            output_files = sep.separate(input_file)
 
     print(f"Separation complete: {output_files}")
     return output_files
 
 
-def rename_stems(output_files, output_dir, input_file):
+def _move(src, dest):
+    """Rename src -> dest; copy only if they sit on different filesystems."""
+    try:
+        os.replace(src, dest)
+    except OSError as e:
+        if e.errno != errno.EXDEV:
+            raise
+        shutil.copy(src, dest)
+
+
+def find_stems(output_files, output_dir):
     """
-    Normalize output filenames to vocals.wav / no_vocals.wav
-    for compatibility with Stage 2.
+    Resolve audio-separator's output names to paths. Depending on the version
+    it returns bare filenames (relative to output_dir) or full paths, so match
+    on basename against a single scandir of output_dir (no per-file stat).
     """
-    import shutil
+    with os.scandir(output_dir) as it:
+        on_disk = {e.name: e.path for e in it if e.name.endswith(".wav")}
+    return [on_disk.get(os.path.basename(f), f) for f in output_files]
 
+
+def rename_stems(output_files, output_dir):
+    """
+    Normalize output filenames to vocals.wav / no_vocals.wav
+    for compatibility with Stage 2. Stems are moved, not copied.
+    """
     vocals_dest = os.path.join(output_dir, "vocals.wav")
     instrumental_dest = os.path.join(output_dir, "no_vocals.wav")
 
-    for f in output_files:
+    for f in find_stems(output_files, output_dir):
         fname = os.path.basename(f).lower()
         if "vocal" in fname and "instrument" not in fname and "no_vocal" not in fname:
-            shutil.copy(f, vocals_dest)
+            _move(f, vocals_dest)
             print(f"  vocals.wav <- {f}")
         elif "instrument" in fname or "no_vocal" in fname or "(instrumental)" in fname:
-            shutil.copy(f, instrumental_dest)
+            _move(f, instrumental_dest)
             print(f"  no_vocals.wav <- {f}")
 
     return vocals_dest, instrumental_dest
 
 
+_DEMUCS_SEPARATORS = {}   # model name -> demucs.api.Separator (reused across calls)
+
+
+def _demucs_separator(model_name):
+    """Load a Demucs model once per process and reuse it (keeps the CUDA context warm)."""
+    if model_name not in _DEMUCS_SEPARATORS:
+        import torch
+        from demucs.api import Separator
+
+        device = "cuda" if torch.cuda.is_available() else "cpu"
+        _DEMUCS_SEPARATORS[model_name] = Separator(
+            model=model_name, segment=None, overlap=0.25, device=device,
+        )
+    return _DEMUCS_SEPARATORS[model_name]
+
+
 def separate_fallback_demucs(input_file, output_dir):
     """
     Fallback: htdemucs if audio-separator unavailable.
     ~7GB VRAM — may OOM on T4; falls back to mdx_extra_q (CPU-safe) if needed.
+    Runs Demucs in-process via demucs.api (no CLI subprocess / torch re-import).
     """
-    import glob, shutil
-
     os.makedirs(output_dir, exist_ok=True)
-    subprocess.run([sys.executable, "-m", "pip", "install", "demucs", "-q"], check=True)
-    print(f"Fallback: Demucs htdemucs on {input_file}")
+    try:
+        import demucs.api  # noqa: F401
+    except ImportError:
+        # demucs.api only ships in the GitHub release (PyPI 4.0.1 predates it)
+        pip_install("git+https://github.com/adefossez/demucs")
+    import torch
+    from demucs.api import save_audio
 
-    result = subprocess.run(
-        ["python3", "-m", "demucs", "--two-stems", "vocals", "-n", "htdemucs",
-         "-o", output_dir, input_file],
-        capture_output=True, text=True
-    )
-    if result.returncode != 0:
+    print(f"Fallback: Demucs htdemucs on {input_file}")
+    try:
+        model_used = "htdemucs"
+        sep = _demucs_separator(model_used)
+        origin, separated = sep.separate_audio_file(input_file)
+    except torch.cuda.OutOfMemoryError:
         print("WARNING: htdemucs OOM -- retrying with mdx_extra_q")
-        subprocess.run(
-            ["python3", "-m", "demucs", "--two-stems", "vocals", "-n", "mdx_extra_q",
-             "-o", output_dir, input_file],
-            check=True
-        )
+        _DEMUCS_SEPARATORS.pop(model_used, None)
+        gc.collect()
+        torch.cuda.empty_cache()
         model_used = "mdx_extra_q"
-    else:
-        model_used = "htdemucs"
+        sep = _demucs_separator(model_used)
+        origin, separated = sep.separate_audio_file(input_file)
 
-    base = os.path.splitext(os.path.basename(input_file))[0]
-    pattern = os.path.join(output_dir, model_used, base, "*.wav")
-    stems = glob.glob(pattern)
+    # Same as `--two-stems vocals`: everything that isn't vocals is the backing track
+    vocals = separated["vocals"]
+    no_vocals = sum(wav for name, wav in separated.items() if name != "vocals")
 
-    import shutil
-    for s in stems:
-        name = os.path.splitext(os.path.basename(s))[0]
-        dest = os.path.join(output_dir, f"{name}.wav")
-        shutil.copy(s, dest)
-        print(f"  {name}.wav -> {dest}")
+    vocals_dest = os.path.join(output_dir, "vocals.wav")
+    instrumental_dest = os.path.join(output_dir, "no_vocals.wav")
+    save_audio(vocals, vocals_dest, sep.samplerate)
+    save_audio(no_vocals, instrumental_dest, sep.samplerate)
+    print(f"  vocals.wav -> {vocals_dest} ({model_used})")
+    print(f"  no_vocals.wav -> {instrumental_dest} ({model_used})")
 
+    return vocals_dest, instrumental_dest
 
-if __name__ == "__main__":
-    install_deps()
 
-    if not os.path.isfile(INPUT_FILE):
-        raise FileNotFoundError(f"Input not found: {INPUT_FILE}")
+def input_fingerprint(input_file, probe_bytes=1 << 20):
+    """Cheap content fingerprint: BLAKE2b of the first + last 1MB and the file size."""
+    size = os.path.getsize(input_file)
+    h = hashlib.blake2b(digest_size=16)
+    with open(input_file, "rb") as f:
+        h.update(f.read(probe_bytes))
+        if size > probe_bytes:
+            f.seek(max(probe_bytes, size - probe_bytes))
+            h.update(f.read(probe_bytes))
+    h.update(str(size).encode())
+    return h.hexdigest()
+
+
+def separate(input_file, output_dir):
+    """
+    Stage 1: BS-Roformer, falling back to Demucs. Skips separation when
+    output_dir already holds stems for this exact input (.stage1.manifest).
+    Returns (vocals_path, no_vocals_path).
+    """
+    vocals = os.path.join(output_dir, "vocals.wav")
+    no_vocals = os.path.join(output_dir, "no_vocals.wav")
+    manifest = os.path.join(output_dir, ".stage1.manifest")
+
+    fingerprint = input_fingerprint(input_file)
+    if os.path.isfile(vocals) and os.path.isfile(no_vocals) and os.path.isfile(manifest):
+        with open(manifest) as f:
+            if f.read().strip() == fingerprint:
+                print(f"Stems already up to date for {input_file} -- skipping separation")
+                return vocals, no_vocals
+
+    # Invalidate first: if separation dies half-way, stale stems from another
+    # song must not be left next to a manifest that still vouches for them.
+    # Whole seconds, so coarse-mtime filesystems still count our writes as new.
+    started = int(time.time())
+    for path in (manifest, vocals, no_vocals):
+        try:
+            os.remove(path)
+        except OSError as e:
+            if e.errno != errno.ENOENT:
+                raise
 
     try:
-        output_files = separate_bs_roformer(INPUT_FILE, OUTPUT_DIR)
-        vocals_path, instr_path = rename_stems(output_files, OUTPUT_DIR, INPUT_FILE)
+        output_files = separate_bs_roformer(input_file, output_dir)
+        rename_stems(output_files, output_dir)
     except Exception as e:
         print(f"WARNING: BS-Roformer failed ({e}), falling back to Demucs...")
-        separate_fallback_demucs(INPUT_FILE, OUTPUT_DIR)
+        separate_fallback_demucs(input_file, output_dir)
 
     # Verify outputs exist
-    vocals = os.path.join(OUTPUT_DIR, "vocals.wav")
-    no_vocals = os.path.join(OUTPUT_DIR, "no_vocals.wav")
     assert os.path.isfile(vocals), f"vocals.wav not found at {vocals}"
     assert os.path.isfile(no_vocals), f"no_vocals.wav not found at {no_vocals}"
 
+    if all(os.path.getmtime(p) >= started for p in (vocals, no_vocals)):
+        with open(manifest, "w") as f:
+            f.write(fingerprint + "\n")
+    return vocals, no_vocals
+
+
+def main(**overrides):
+    """
+    Run Stage 1 end-to-end. Keyword args override the CONFIG block by
+    lower-case name, e.g. main(input_file="/content/song.mp3").
+    """
+    for key, value in overrides.items():
+        if key.upper() not in CONFIG_KEYS:
+            raise TypeError(f"main() got an unexpected keyword argument '{key}'")
+        globals()[key.upper()] = value
+    install_deps()
+
+    if not os.path.isfile(INPUT_FILE):
+        raise FileNotFoundError(f"Input not found: {INPUT_FILE}")
+
+    vocals, no_vocals = separate(INPUT_FILE, OUTPUT_DIR)
+
     print(f"\nStage 1 complete.")
     print(f"  vocals.wav     -> {vocals}")
     print(f"  no_vocals.wav  -> {no_vocals}")
     print("\nRun Stage 2 next.")
+    return vocals, no_vocals
+
+
+if __name__ == "__main__":
+    main()
@@ -10,6 +10,8 @@ v5 changes:
   - Transcribe from the FULL MIX (vocals + instruments) for better temporal grounding
     but run ctc-forced-aligner on the clean VOCAL STEM for precise boundary alignment
   - Vocal-only track kept for ctc alignment (cleaner signal for boundary detection)
+  - Whisper runs on faster-whisper (CTranslate2, int8_float16): ~4x faster, ~2GB VRAM
+    (falls back to whisper-timestamped if faster-whisper can't be imported)
 
 Alignment pipeline:
   1. whisper-large-v3 on full mix → gets accurate lyrics text + rough timestamps
@@ -24,11 +26,19 @@ Outputs:
     /kaggle/working/output/alignment_method.txt - Which method was used
 """
 
+from __future__ import annotations
+
+import importlib.util
 import os
-import json
+import shutil
 import subprocess
 import sys
-import gc
+import functools
+from dataclasses import dataclass
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    import numpy as np
 
 # --- CONFIG -------------------------------------------------------------------------
 VOCALS_WAV    = "/kaggle/working/output/vocals.wav"   # clean vocal stem (for CTC alignment)
@@ -37,7 +47,18 @@ OUTPUT_DIR    = "/kaggle/working/output"
 LYRICS_PROMPT = ""   # Optional: paste known lyrics here for better accuracy
                      # Example: "I was born a coal miners daughter..."
                      # Leave empty for blind transcription
+CACHE_DIR     = "/kaggle/working/.cache"   # persistent model cache (survives re-runs)
+BATCH_SIZE    = 8    # VAD chunks decoded together: T4 ~8, A100 16-32; 1 = sequential
 # ------------------------------------------------------------------------------------
+CONFIG_KEYS = (   # what main(**overrides) may set
+    "VOCALS_WAV", "FULL_MIX_WAV", "OUTPUT_DIR", "LYRICS_PROMPT", "CACHE_DIR", "BATCH_SIZE",
+)
+
+# Point HF / torch / whisper caches at CACHE_DIR so weights are downloaded once,
+# not on every session. Must happen before torch/transformers are imported.
+os.environ.setdefault("HF_HOME", os.path.join(CACHE_DIR, "hf"))
+os.environ.setdefault("TORCH_HOME", os.path.join(CACHE_DIR, "torch"))
+os.environ.setdefault("XDG_CACHE_HOME", CACHE_DIR)
 
 # Whisper params tuned for karaoke (v5: hallucination-safe)
 WHISPER_PARAMS = {
@@ -48,121 +69,612 @@ WHISPER_PARAMS = {
     "compression_ratio_threshold":   2.8,
     "no_speech_threshold":           0.6,        # v5: was 1.0, lowered to avoid false positives
     "condition_on_previous_text":    False,       # v5: CRITICAL - prevents hallucination loops
+                                                  # (looping segments are always retried unconditioned)
     "enable_vad":                    True,
+    "compute_type":                  "int8_float16",  # CTranslate2 quantization (GPU)
 }
 
+# Silero VAD pre-segmentation for the batched pipeline only: speech regions are
+# merged into <=30s chunks and decoded BATCH_SIZE at a time, so the silent
+# stretches of a vocal stem never reach the decoder. 500ms (vs the batched
+# default of 160ms) keeps breaths from splitting phrases.
+VAD_PARAMS = {"min_silence_duration_ms": 500, "speech_pad_ms": 200}
+
+# Convert openai/whisper-<model> once to a CTranslate2 model whose weights are
+# stored already quantized to WHISPER_PARAMS["compute_type"] (cached under
+# CACHE_DIR/ct2): half the bytes to read vs the stock fp16 download, and no
+# quantize-on-load. False = load the stock Systran/faster-whisper-* weights.
+CONVERT_TO_CT2 = True
+
+# Two-pass decoding: a greedy first pass (best_of=1), then re-decode only the
+# segments that look unreliable with the full best_of/temperature settings
+REDECODE_LOGPROB_BELOW     = -0.8
+REDECODE_COMPRESSION_ABOVE = 2.4
+REDECODE_TEMPERATURES      = (0.0, 0.2, 0.4)
+
+# Long audio (albums, concerts) is decoded and processed in overlapping windows
+# so peak memory is one window regardless of length. Normal songs stay whole-file.
+STREAM_MIN_S     = 600   # stream only files longer than this (seconds)
+STREAM_CHUNK_S   = 30    # window length
+STREAM_OVERLAP_S = 2     # overlap between consecutive windows
+
+# torch.compile the CTC aligner (CUDA only). Costs ~1 min of compile on first
+# load; pays off on long audio and multi-song batches.
+COMPILE_ALIGNER  = True
+# Copy input audio to tmpfs (/dev/shm) before decoding; skipped if it won't fit.
+# Costs an extra read+write per file, so only worth it on slow network overlays.
+STAGE_TO_SHM     = False
+
+# 30s windows per aligner forward. None = size to free VRAM on GPU (8 on CPU).
+ALIGNER_BATCH_SIZE = None
+
+# The torch/MMS aligner (load_alignment_model, generate_emissions) is only on
+# GitHub; PyPI's ctc-forced-aligner is an unrelated ONNX package of the same name.
+CTC_ALIGNER_URL = "git+https://github.com/MahmoudAshraf97/ctc-forced-aligner.git"
+
+
+def pip_install(*packages, check=True):
+    """Install with uv (parallel resolve/download); falls back to plain pip."""
+    if subprocess.run([sys.executable, "-m", "uv", "--version"], capture_output=True).returncode != 0:
+        subprocess.run([sys.executable, "-m", "pip", "install", "uv", "-q"], check=False)
+    r = subprocess.run(
+        [sys.executable, "-m", "uv", "pip", "install", "--python", sys.executable, "-q", *packages]
+    )
+    if r.returncode == 0:
+        return r
+    return subprocess.run([sys.executable, "-m", "pip", "install", *packages, "-q"], check=check)
+
+
+def importable(*modules):
+    """True if every module is already installed (lets install_deps skip pip entirely)."""
+    return all(importlib.util.find_spec(m) is not None for m in modules)
+
+
+def has_ctc_aligner():
+    """True if the GitHub ctc-forced-aligner (not the PyPI namesake) is installed."""
+    if not importable("ctc_forced_aligner"):
+        return False
+    try:
+        from ctc_forced_aligner import load_alignment_model  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
 
 def install_deps():
-    print("Installing whisper-timestamped + ctc-forced-aligner...")
-    subprocess.run(
-        [sys.executable, "-m", "pip", "install",
-         "whisper-timestamped", "openai-whisper",
-         "ctc-forced-aligner", "transformers", "torch",
-         "-q"],
-        check=True
-    )
+    # import name -> pip name; only what's missing is installed
+    packages = {
+        "faster_whisper": "faster-whisper",
+        "orjson":         "orjson",
+        "soundfile":      "soundfile",
+        "mutagen":        "mutagen",
+    }
+    missing = [pkg for mod, pkg in packages.items() if not importable(mod)]
+    if not has_ctc_aligner():
+        missing.append(CTC_ALIGNER_URL)   # brings its own torch/transformers requirements
+    if not missing:
+        return
+    print(f"Installing {', '.join(missing)}...")
+    pip_install(*missing)
+
+
+def stage_to_shm(path):
+    """
+    Copy `path` into tmpfs so decoding reads from RAM instead of the slow
+    /kaggle/working overlay. Returns the new path (or `path` unchanged if
+    /dev/shm is missing or too small); the caller deletes staged copies.
+    """
+    import tempfile
 
+    if not STAGE_TO_SHM or not os.path.isdir("/dev/shm"):
+        return path
+    size = os.path.getsize(path)
+    if shutil.disk_usage("/dev/shm").free < 2 * size:
+        return path
+    # Unique name: two songs' vocals.wav must not overwrite each other
+    fd, dest = tempfile.mkstemp(suffix=os.path.splitext(path)[1], dir="/dev/shm")
+    with os.fdopen(fd, "wb") as dst, open(path, "rb") as src:
+        shutil.copyfileobj(src, dst)
+    return dest
 
-def transcribe_whisper(audio_file, prompt=""):
+
+def get_audio_duration(audio_file):
     """
-    Step 1: Transcribe with whisper-large-v3.
-    Uses the full mix (or vocals WAV if mix not available) for temporal grounding.
-    Returns (words_list, raw_text) — timestamps are from Whisper internal
-    alignment and will be replaced by ctc-forced-aligner in step 2.
+    Duration in seconds from the file header: libsndfile (WAV/FLAC/MP3), then
+    mutagen (M4A/AAC/...), and ffprobe only if neither can read it.
     """
-    import whisper_timestamped as whisper
+    try:
+        import soundfile as sf
+        return sf.info(audio_file).duration
+    except Exception:
+        pass
+    try:
+        from mutagen import File
+        return File(audio_file).info.length
+    except Exception:
+        pass
+    r = subprocess.run(
+        ["ffprobe", "-v", "error", "-show_entries", "format=duration",
+         "-of", "default=noprint_wrappers=1:nokey=1", audio_file],
+        capture_output=True, text=True
+    )
+    return float(r.stdout.strip())
 
-    print(f"Loading Whisper {WHISPER_PARAMS['model']}...")
-    model = whisper.load_model(WHISPER_PARAMS["model"])
 
-    print(f"Transcribing: {audio_file}")
-    if prompt:
-        print(f"  Using lyrics prompt ({len(prompt)} chars)")
+def stream_audio_16k(audio_file, chunk_s=STREAM_CHUNK_S, overlap_s=STREAM_OVERLAP_S):
+    """
+    Yield (offset_s, samples, is_last) windows of 16kHz mono float32 audio,
+    decoded incrementally by ffmpeg. Consecutive windows overlap by overlap_s.
+    """
+    import numpy as np
+
+    sr = 16000
+    chunk, hop = int(chunk_s * sr), int((chunk_s - overlap_s) * sr)
+    proc = subprocess.Popen(
+        ["ffmpeg", "-nostdin", "-v", "error", "-i", audio_file,
+         "-ac", "1", "-ar", str(sr), "-f", "f32le", "-"],
+        stdout=subprocess.PIPE,
+    )
+    def read(n):
+        # bytearray -> writable array, so torch.from_numpy() can share it
+        return np.frombuffer(bytearray(proc.stdout.read(n * 4)), np.float32)
 
-    audio = whisper.load_audio(audio_file)
-    result = whisper.transcribe(
-        model,
-        audio,
-        language="en",
-        initial_prompt=prompt if prompt else None,
-        word_timestamps=WHISPER_PARAMS["word_timestamps"],
-        temperature=WHISPER_PARAMS["temperature"],
-        best_of=WHISPER_PARAMS["best_of"],
-        compression_ratio_threshold=WHISPER_PARAMS["compression_ratio_threshold"],
-        no_speech_threshold=WHISPER_PARAMS["no_speech_threshold"],
-        condition_on_previous_text=WHISPER_PARAMS["condition_on_previous_text"],
-        vad=WHISPER_PARAMS["enable_vad"],
+    try:
+        buf, offset = read(chunk), 0
+        while True:
+            new = read(hop)   # read ahead so the caller knows which window is last
+            yield offset / sr, buf, len(new) == 0
+            if len(new) == 0:
+                break
+            buf = np.concatenate([buf[hop:], new])
+            offset += hop
+    finally:
+        proc.stdout.close()
+        proc.wait()
+
+
+def load_waveform_16k(path):
+    """Decode `path` to 16kHz mono float32, cached per (path, mtime)."""
+    return _load_waveform_16k(path, os.path.getmtime(path))
+
+
+@functools.lru_cache(maxsize=4)
+def _load_waveform_16k(path, mtime):
+    import numpy as np
+
+    # ffmpeg downmixes + resamples while decoding: no 44.1kHz stereo intermediate
+    r = subprocess.run(
+        ["ffmpeg", "-nostdin", "-v", "error", "-i", path,
+         "-ac", "1", "-ar", "16000", "-f", "f32le", "-"],
+        capture_output=True, check=True
     )
+    # bytearray -> writable array, so torch.from_numpy() can share it
+    return np.frombuffer(bytearray(r.stdout), np.float32)
 
-    # Extract flat word list
-    words = []
-    for seg in result.get("segments", []):
-        for w in seg.get("words", []):
-            words.append({
-                "word":  w["text"].strip(),
-                "start": round(w["start"], 3),
-                "end":   round(w["end"], 3),
-                "conf":  round(w.get("confidence", 1.0), 3),
-            })
 
-    # Build plain text transcript for aligner
-    raw_text = " ".join(w["word"] for w in words)
+def audio_windows(audio_file):
+    """
+    Yield (offset_s, samples, own_start, own_end) for Stage 2 processing, where
+    samples is 16kHz mono float32. Short files are one window, decoded once
+    and shared by Whisper and the aligner (load_waveform_16k). Long files are streamed;
+    each window "owns" the words whose midpoint falls in [own_start, own_end),
+    which splits the overlap evenly so no word is emitted twice.
+    """
+    if get_audio_duration(audio_file) <= STREAM_MIN_S:
+        yield 0.0, load_waveform_16k(audio_file), 0.0, float("inf")
+        return
+    print(f"  Long audio: streaming {STREAM_CHUNK_S}s windows")
+    half = STREAM_OVERLAP_S / 2
+    for offset, samples, is_last in stream_audio_16k(audio_file):
+        own_start = offset + half if offset else 0.0
+        own_end = float("inf") if is_last else offset + STREAM_CHUNK_S - half
+        yield offset, samples, own_start, own_end
 
-    print(f"  Transcribed {len(words)} words")
 
-    # CRITICAL: Unload model to free ~10GB VRAM before running aligner
-    del model
-    del audio
-    gc.collect()
+def ct2_model_dir(name):
+    return os.path.join(CACHE_DIR, "ct2", f"whisper-{name}-{WHISPER_PARAMS['compute_type']}")
+
+
+def convert_whisper_ct2(name):
+    """
+    Return a local CTranslate2 model dir with pre-quantized weights for
+    openai/whisper-<name>, converting on first use. Falls back to `name`
+    (stock faster-whisper download, quantized at load) if conversion fails.
+    """
+    if "/" in name or os.path.isdir(name):
+        return name   # already a repo id / local model
+    out_dir = ct2_model_dir(name)
+    if os.path.isfile(os.path.join(out_dir, "model.bin")):
+        return out_dir
+
+    quantization = WHISPER_PARAMS["compute_type"]
+    print(f"Converting openai/whisper-{name} to CTranslate2 {quantization} (one-time)...")
+    tmp_dir = out_dir + ".partial"
     try:
-        import torch
-        torch.cuda.empty_cache()
-        print("  Whisper model unloaded, VRAM freed for aligner")
-    except Exception:
-        pass
+        from ctranslate2.converters import TransformersConverter
+
+        TransformersConverter(
+            f"openai/whisper-{name}",
+            copy_files=["tokenizer.json", "preprocessor_config.json"],
+            load_as_float16=True, low_cpu_mem_usage=True,
+        ).convert(tmp_dir, quantization=quantization, force=True)
+        os.replace(tmp_dir, out_dir)   # only a finished conversion counts as cached
+    except Exception as e:
+        print(f"WARNING: CTranslate2 conversion failed ({e}), using stock weights")
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        return name
+    print(f"  Cached: {out_dir}")
+    return out_dir
 
-    return words, raw_text, result
+
+def prefetch_whisper(name=None):
+    """
+    Download the weights get_whisper_model() will need (network-bound; run it
+    in a thread while Stage 1 uses the GPU). No-op once a converted model is cached.
+    """
+    name = name or WHISPER_PARAMS["model"]
+    try:
+        from huggingface_hub import snapshot_download
+
+        if CONVERT_TO_CT2:
+            if os.path.isfile(os.path.join(ct2_model_dir(name), "model.bin")):
+                return
+            repo_id = f"openai/whisper-{name}"
+            snapshot_download(repo_id, allow_patterns=["*.json", "*.txt", "model.safetensors"])
+        else:
+            repo_id = f"Systran/faster-whisper-{name}"
+            snapshot_download(repo_id)
+        print(f"[prefetch] {repo_id} cached")
+    except Exception as e:
+        print(f"[prefetch] skipped ({e}); Stage 2 will download on demand")
 
 
-def align_with_ctc(vocals_wav, transcript_text, whisper_words):
+_MODEL_CACHE = {}   # Whisper model name -> (backend, model), kept for the process lifetime
+
+
+def get_whisper_model(name=None):
     """
-    Step 2: Re-align Whisper's transcript to the audio waveform using
-    ctc-forced-aligner (MMS-300M). Replaces Whisper word timestamps
-    with acoustically-grounded boundaries — especially important for
-    sung/held vowels which Whisper often timestamps too early/late.
+    Load Whisper once per process (per model name) and reuse it for every
+    later song. Returns (backend, model): faster-whisper (int8_float16 leaves
+    room for the aligner), or whisper-timestamped if faster-whisper/CTranslate2
+    can't be imported.
+    """
+    name = name or WHISPER_PARAMS["model"]
+    if name not in _MODEL_CACHE:
+        _MODEL_CACHE[name] = _load_whisper_model(name)
+    return _MODEL_CACHE[name]
+
+
+def _load_whisper_model(name):
+    import torch
+
+    device = "cuda" if torch.cuda.is_available() else "cpu"
+    try:
+        from faster_whisper import WhisperModel
+
+        compute_type = WHISPER_PARAMS["compute_type"] if device == "cuda" else "int8"
+        model_path = convert_whisper_ct2(name) if CONVERT_TO_CT2 else name
+        print(f"Loading Whisper {name} (faster-whisper, {compute_type})...")
+        model = WhisperModel(model_path, device=device, compute_type=compute_type)
+        if BATCH_SIZE > 1:
+            try:
+                from faster_whisper import BatchedInferencePipeline
+            except ImportError:   # faster-whisper < 1.1
+                return "faster_whisper", model
+            return "faster_whisper_batched", BatchedInferencePipeline(model=model)
+        return "faster_whisper", model
+    except ImportError as e:
+        print(f"WARNING: faster-whisper unavailable ({e}), falling back to whisper-timestamped")
+        pip_install("whisper-timestamped", "openai-whisper")
+        import whisper_timestamped as whisper
+
+        print(f"Loading Whisper {name} (whisper-timestamped)...")
+        return "whisper_timestamped", whisper.load_model(
+            name, device=device,
+            download_root=os.path.join(CACHE_DIR, "whisper"),
+        )
 
-    Uses CLEAN VOCAL STEM (not full mix) for best alignment accuracy.
 
-    Returns aligned word list with corrected start/end times.
+@functools.lru_cache(maxsize=1)
+def get_alignment_model():
+    """Load ctc-forced-aligner's MMS-300M once per process (~2GB VRAM)."""
+    import torch
+    from ctc_forced_aligner import load_alignment_model
+
+    device = "cuda" if torch.cuda.is_available() else "cpu"
+    print(f"Loading ctc-forced-aligner (MMS-300M) on {device}...")
+    alignment_model, alignment_tokenizer = load_alignment_model(
+        device,
+        dtype=torch.float16 if device == "cuda" else torch.float32,
+    )
+    if device == "cpu":
+        # int8 Linear kernels (fbgemm/oneDNN): ~2-4x faster on AVX2/AVX-512 CPUs;
+        # activations stay fp32
+        alignment_model = torch.ao.quantization.quantize_dynamic(
+            alignment_model, {torch.nn.Linear}, dtype=torch.qint8
+        )
+        print("  CPU aligner: dynamic int8 quantization of Linear layers")
+    # Sized once, with the model already resident, so every song runs the
+    # same full-batch shape (the compiled graph handles any batch size)
+    batch_size = aligner_batch_size()
+    if device == "cuda" and COMPILE_ALIGNER:
+        alignment_model = _compile_aligner(alignment_model, device)
+    return alignment_model, alignment_tokenizer, device, batch_size
+
+
+def aligner_batch_size():
+    """Windows per aligner forward: ALIGNER_BATCH_SIZE, or sized to free VRAM (~512MB/window in fp16)."""
+    import torch
+
+    if ALIGNER_BATCH_SIZE:
+        return ALIGNER_BATCH_SIZE
+    if not torch.cuda.is_available():
+        return 8
+    free_bytes, _ = torch.cuda.mem_get_info()
+    batch_size = max(1, min(32, free_bytes // (512 << 20)))
+    print(f"  Aligner batch size: {batch_size} ({free_bytes / 2**30:.1f}GB VRAM free)")
+    return batch_size
+
+
+def _compile_aligner(alignment_model, device):
     """
+    torch.compile the aligner with CUDA graphs ("reduce-overhead") and warm it
+    up so the first real song isn't timed with compilation. A graph replay
+    reuses its output buffer, but generate_emissions keeps every batch's
+    logits until it concatenates them, so each call's logits are cloned out.
+    """
+    import torch
+    from ctc_forced_aligner import generate_emissions
+
+    mark_step = getattr(torch.compiler, "cudagraph_mark_step_begin", lambda: None)
+
     try:
-        import torch
-        from ctc_forced_aligner import (
-            load_audio, load_alignment_model,
-            generate_emissions, get_alignments,
-            get_spans, postprocess_results,
+        compiled = torch.compile(alignment_model, mode="reduce-overhead", fullgraph=False)
+
+        def graphed(input_values):
+            mark_step()
+            out = compiled(input_values)
+            out.logits = out.logits.clone()
+            return out
+
+        print("  Compiling aligner (torch.compile, CUDA graphs)...")
+        # Songs run full batches plus one partial batch of any size. 2 then 3
+        # windows makes dynamo recompile with a dynamic batch dim (automatic
+        # dynamic shapes); 1 window covers the size-1 specialisation. Capped at
+        # 3 windows so the warm-up can't OOM on first load.
+        with torch.inference_mode():
+            for n_windows in (2, 3, 1):
+                dummy = torch.zeros(n_windows * 30 * 16000, dtype=alignment_model.dtype, device=device)
+                generate_emissions(graphed, dummy, batch_size=n_windows)
+        return graphed
+    except Exception as e:
+        print(f"WARNING: torch.compile failed ({e}), using eager aligner")
+        return alignment_model
+
+
+@dataclass
+class WordList:
+    """
+    Word timings as struct-of-arrays: one list of strings plus parallel float
+    arrays, instead of a dict per word. `source` tags which stage timed them.
+    """
+    text: list
+    start: "np.ndarray"
+    end: "np.ndarray"
+    conf: "np.ndarray"
+    source: str = "whisper_word_timestamps"
+
+    def __len__(self):
+        return len(self.text)
+
+    @classmethod
+    def from_whisper(cls, segments):
+        """Fill preallocated arrays from whisper-style result["segments"]."""
+        import numpy as np
+
+        n = sum(len(seg["words"]) for seg in segments)
+        words = cls([], np.empty(n), np.empty(n), np.empty(n))
+        i = 0
+        for seg in segments:
+            for w in seg["words"]:
+                words.text.append(w["text"].strip())
+                words.start[i], words.end[i] = w["start"], w["end"]
+                words.conf[i] = w.get("confidence", 1.0)
+                i += 1
+        return words
+
+    @classmethod
+    def from_ctc(cls, items):
+        """Build from ctc-forced-aligner postprocess_results() dicts."""
+        import numpy as np
+
+        return cls(
+            [item["label"] for item in items],
+            np.fromiter((item["start"] for item in items), float, len(items)),
+            np.fromiter((item["end"] for item in items), float, len(items)),
+            np.fromiter((item.get("score", 1.0) for item in items), float, len(items)),
+            source="ctc_forced_aligner",
         )
 
-        print("Running ctc-forced-aligner (MMS-300M) on clean vocal stem...")
-        device = "cuda" if torch.cuda.is_available() else "cpu"
-        print(f"  Device: {device}")
+    def owned_by(self, own_start, own_end):
+        """Boolean mask of words whose midpoint falls in [own_start, own_end)."""
+        mid = (self.start + self.end) / 2
+        return (mid >= own_start) & (mid < own_end)
+
+    def to_records(self):
+        """words.json layout (list of dicts), as read by Stage 3."""
+        return [
+            {"word": t, "start": s, "end": e, "conf": c, "source": self.source}
+            for t, s, e, c in zip(self.text, self.start.tolist(), self.end.tolist(), self.conf.tolist())
+        ]
+
+
+def _decode_window(backend, model, audio, prompt, **overrides):
+    """
+    Transcribe one 16kHz window. Returns (segments, language) with segments in
+    whisper-timestamped's dict shape (what transcription.json stores),
+    timestamps relative to the window. `overrides` replace decode kwargs.
+    """
+    kwargs = dict(
+        language="en",
+        initial_prompt=prompt if prompt else None,
+        temperature=WHISPER_PARAMS["temperature"],
+        best_of=WHISPER_PARAMS["best_of"],
+        compression_ratio_threshold=WHISPER_PARAMS["compression_ratio_threshold"],
+        no_speech_threshold=WHISPER_PARAMS["no_speech_threshold"],
+        condition_on_previous_text=WHISPER_PARAMS["condition_on_previous_text"],
+    )
+    kwargs.update(overrides)
 
-        # Load aligner model (~2GB VRAM)
-        alignment_model, alignment_tokenizer = load_alignment_model(
-            device,
-            dtype=torch.float16 if device == "cuda" else torch.float32,
+    if backend == "whisper_timestamped":
+        import torch
+        import whisper_timestamped as whisper
+
+        with torch.inference_mode():
+            result = whisper.transcribe(model, audio, vad=WHISPER_PARAMS["enable_vad"], **kwargs)
+        return result["segments"], result.get("language")
+
+    # whisper_timestamped has no word_timestamps kwarg (it always returns words)
+    kwargs["word_timestamps"] = WHISPER_PARAMS["word_timestamps"]
+    if backend == "faster_whisper_batched":
+        # VAD cuts the window into speech chunks, decoded BATCH_SIZE at a time.
+        # The sequential WhisperModel (BATCH_SIZE=1, re-decodes) keeps
+        # faster-whisper's own VadOptions defaults.
+        kwargs["batch_size"] = BATCH_SIZE
+        kwargs["vad_parameters"] = dict(VAD_PARAMS)   # copy: the pipeline edits it in place
+    segments, info = model.transcribe(audio, vad_filter=WHISPER_PARAMS["enable_vad"], **kwargs)
+    return [
+        {
+            "start":             seg.start,
+            "end":               seg.end,
+            "text":              seg.text,
+            "avg_logprob":       seg.avg_logprob,
+            "compression_ratio": seg.compression_ratio,
+            "no_speech_prob":    seg.no_speech_prob,
+            "words": [
+                {"text": w.word, "start": w.start, "end": w.end, "confidence": w.probability}
+                for w in (seg.words or [])
+            ],
+        }
+        for seg in segments   # generator: decoding happens here
+    ], info.language
+
+
+def _is_looping(seg):
+    """Highly compressible text = repeated phrases, Whisper's hallucination signature."""
+    return seg["compression_ratio"] > REDECODE_COMPRESSION_ABOVE
+
+
+def _needs_redecode(seg):
+    return seg["avg_logprob"] < REDECODE_LOGPROB_BELOW or _is_looping(seg)
+
+
+def _decode_two_pass(backend, model, audio, prompt):
+    """
+    Greedy first pass over the window; segments flagged by _needs_redecode()
+    are re-decoded from their own audio slice with best_of/temperature
+    fallback and spliced back in. Clean vocals rarely need the second pass.
+    Looping segments are retried with no prompt and no conditioning, since
+    a poisoned prompt makes every temperature in the fallback chain loop too.
+    """
+    segments, language = _decode_window(
+        backend, model, audio, prompt, temperature=0.0, best_of=1, beam_size=1,
+    )
+    flagged = sum(map(_needs_redecode, segments))
+    if not flagged:
+        return segments, language
+
+    print(f"  Re-decoding {flagged}/{len(segments)} low-confidence segments")
+    # Retries go through the sequential WhisperModel: it encodes each slice
+    # once and reuses that encoder output for every temperature / best_of
+    # candidate. The batched pipeline has no temperature fallback at all.
+    if backend == "faster_whisper_batched":
+        backend, model = "faster_whisper", model.model
+    spliced = []
+    for seg in segments:
+        if not _needs_redecode(seg):
+            spliced.append(seg)
+            continue
+        t0 = seg["start"]
+        looping = _is_looping(seg)
+        retry, _ = _decode_window(
+            backend, model, audio[int(t0 * 16000):int(seg["end"] * 16000)],
+            "" if looping else prompt,
+            temperature=REDECODE_TEMPERATURES,
+            condition_on_previous_text=False if looping else WHISPER_PARAMS["condition_on_previous_text"],
         )
+        if not retry:
+            spliced.append(seg)
+            continue
+        for r in retry:
+            r["start"] += t0
+            r["end"] += t0
+            for w in r["words"]:
+                w["start"] += t0
+                w["end"] += t0
+        spliced.extend(retry)
+    return spliced, language
+
+
+def transcribe_whisper(audio_file, prompt="", whisper_model=None):
+    """
+    Step 1: Transcribe with whisper-large-v3.
+    Uses the full mix (or vocals WAV if mix not available) for temporal grounding.
+    Returns (WordList, raw_text, result) — timestamps are from Whisper internal
+    alignment and will be replaced by ctc-forced-aligner in step 2.
+    whisper_model: optional preloaded (backend, model) from get_whisper_model().
+    """
+    backend, model = whisper_model or get_whisper_model()
+
+    print(f"Transcribing: {audio_file}")
+    if prompt:
+        print(f"  Using lyrics prompt ({len(prompt)} chars)")
+
+    result = {"language": None, "segments": []}
+    for offset, audio, own_start, own_end in audio_windows(audio_file):
+        segments, language = _decode_two_pass(backend, model, audio, prompt)
+        result["language"] = result["language"] or language
+
+        for seg in segments:
+            seg_words = [
+                dict(w, start=offset + w["start"], end=offset + w["end"])
+                for w in seg["words"]
+                if own_start <= offset + (w["start"] + w["end"]) / 2 < own_end
+            ]
+            if not seg_words and not own_start <= offset + (seg["start"] + seg["end"]) / 2 < own_end:
+                continue   # belongs to the neighbouring window
+            result["segments"].append(dict(
+                seg,
+                id=len(result["segments"]),
+                start=offset + seg["start"],
+                end=offset + seg["end"],
+                words=seg_words,
+            ))
+    result["text"] = "".join(seg["text"] for seg in result["segments"])
+
+    words = WordList.from_whisper(result["segments"])
+
+    # Build plain text transcript for aligner
+    raw_text = " ".join(words.text)
+
+    print(f"  Transcribed {len(words)} words")
+    return words, raw_text, result
+
+
+def _ctc_align(audio_waveform, transcript_text):
+    """Run the resident aligner over one waveform; returns ctc-forced-aligner word dicts."""
+    import torch
+    from ctc_forced_aligner import (
+        generate_emissions, get_alignments, get_spans, postprocess_results,
+    )
 
-        audio_waveform = load_audio(vocals_wav, alignment_model.dtype, device)
+    alignment_model, alignment_tokenizer, _, batch_size = get_alignment_model()
+    # inference_mode: no autograd graph / view tracking for any of the tensors below
+    with torch.inference_mode():
         emissions, stride = generate_emissions(
-            alignment_model, audio_waveform, batch_size=8
+            alignment_model, audio_waveform, batch_size=batch_size
         )
 
-        del alignment_model  # free VRAM after emissions
-        gc.collect()
-        if device == "cuda":
-            torch.cuda.empty_cache()
-
         # Tokenize at word level
         tokens_starred, text_starred = (
             alignment_tokenizer(transcript_text, return_tensors="pt", padding=True)
@@ -174,18 +686,46 @@ def align_with_ctc(vocals_wav, transcript_text, whisper_words):
             alignment_tokenizer,
         )
         spans = get_spans(tokens_starred, segments, blank_token)
-        word_timestamps = postprocess_results(text_starred, spans, stride, scores)
+        return postprocess_results(text_starred, spans, stride, scores)
+
+
+def align_with_ctc(vocals_wav, transcript_text, whisper_words):
+    """
+    Step 2: Re-align Whisper's transcript to the audio waveform using
+    ctc-forced-aligner (MMS-300M). Replaces Whisper word timestamps
+    with acoustically-grounded boundaries — especially important for
+    sung/held vowels which Whisper often timestamps too early/late.
+
+    Uses CLEAN VOCAL STEM (not full mix) for best alignment accuracy.
+
+    Returns (WordList, alignment_method) with corrected start/end times.
+    """
+    try:
+        import torch
+
+        # Resident alongside Whisper (no unload/reload between songs)
+        alignment_model, _, device, _ = get_alignment_model()
+        print("Running ctc-forced-aligner (MMS-300M) on clean vocal stem...")
+
+        word_timestamps = []
+        with torch.inference_mode():
+            for offset, audio, own_start, own_end in audio_windows(vocals_wav):
+                audio_waveform = torch.from_numpy(audio).to(device, alignment_model.dtype)
+                if not offset and own_end == float("inf"):
+                    text = transcript_text   # whole file in one window
+                else:
+                    # Align only the Whisper words this window owns
+                    owned = whisper_words.owned_by(own_start, own_end)
+                    text = " ".join(t for t, keep in zip(whisper_words.text, owned) if keep)
+                    if not text:
+                        continue
+                for item in _ctc_align(audio_waveform, text):
+                    item["start"] += offset
+                    item["end"] += offset
+                    word_timestamps.append(item)
 
         # Build corrected word list
-        aligned_words = []
-        for item in word_timestamps:
-            aligned_words.append({
-                "word":  item["label"],
-                "start": round(item["start"], 3),
-                "end":   round(item["end"], 3),
-                "conf":  round(item.get("score", 1.0), 3),
-                "source": "ctc_forced_aligner",
-            })
+        aligned_words = WordList.from_ctc(word_timestamps)
 
         print(f"  Aligned {len(aligned_words)} words with ctc-forced-aligner")
         return aligned_words, "ctc_forced_aligner"
@@ -193,32 +733,45 @@ def align_with_ctc(vocals_wav, transcript_text, whisper_words):
     except Exception as e:
         print(f"WARNING: ctc-forced-aligner failed ({e})")
         print("  Falling back to Whisper internal word_timestamps (still good quality)")
-        # Mark source on existing words
-        for w in whisper_words:
-            w["source"] = "whisper_word_timestamps"
+        whisper_words.source = "whisper_word_timestamps"
         return whisper_words, "whisper_word_timestamps"
 
 
+def write_json(path, obj, indent=False):
+    """Serialize with orjson (C, ~10x faster than json.dump(indent=2)); stdlib json if it's missing."""
+    try:
+        import orjson
+    except ImportError:
+        import json
+
+        print(f"WARNING: orjson not installed -- writing {os.path.basename(path)} with stdlib json")
+        with open(path, "w") as f:
+            json.dump(obj, f, indent=2 if indent else None, separators=None if indent else (",", ":"),
+                      default=lambda o: o.tolist())   # numpy arrays / scalars
+        return
+    option = orjson.OPT_SERIALIZE_NUMPY | (orjson.OPT_INDENT_2 if indent else 0)
+    with open(path, "wb") as f:
+        f.write(orjson.dumps(obj, option=option))
+
+
 def save_outputs(output_dir, whisper_result, aligned_words, alignment_method):
     os.makedirs(output_dir, exist_ok=True)
 
     # Full Whisper JSON
     json_path = os.path.join(output_dir, "transcription.json")
-    with open(json_path, "w") as f:
-        json.dump(whisper_result, f, indent=2)
+    write_json(json_path, whisper_result, indent=True)
     print(f"  Full JSON: {json_path}")
 
-    # Aligned word list (used by Stage 3)
+    # Aligned word list (used by Stage 3; machine-read, so compact)
     words_path = os.path.join(output_dir, "words.json")
-    with open(words_path, "w") as f:
-        json.dump(aligned_words, f, indent=2)
+    write_json(words_path, aligned_words.to_records())
     print(f"  Words JSON: {words_path} ({len(aligned_words)} words)")
 
     # Human-readable preview
     txt_path = os.path.join(output_dir, "transcription.txt")
     with open(txt_path, "w") as f:
-        for w in aligned_words:
-            f.write(f"{w['start']:6.2f}s  {w['word']}\n")
+        for start, word in zip(aligned_words.start, aligned_words.text):
+            f.write(f"{start:6.2f}s  {word}\n")
     print(f"  Preview: {txt_path}")
 
     # Record which alignment method was used
@@ -228,27 +781,68 @@ def save_outputs(output_dir, whisper_result, aligned_words, alignment_method):
     print(f"  Alignment method: {alignment_method}")
 
 
-if __name__ == "__main__":
-    install_deps()
-
-    if not os.path.isfile(VOCALS_WAV):
-        raise FileNotFoundError(f"Vocals not found: {VOCALS_WAV} -- run Stage 1 first")
+def process(vocals_wav, full_mix_wav=None, output_dir=OUTPUT_DIR, prompt="", whisper_model=None):
+    """
+    Run Stage 2 for one song. Models are cached per process, so batch callers
+    only pay the Whisper/aligner load cost on the first song.
+    Returns (aligned_words, alignment_method).
+    """
+    if not os.path.isfile(vocals_wav):
+        raise FileNotFoundError(f"Vocals not found: {vocals_wav} -- run Stage 1 first")
 
     # Use full mix for transcription if available, fall back to vocals-only
-    transcription_source = FULL_MIX_WAV if os.path.isfile(FULL_MIX_WAV) else VOCALS_WAV
+    transcription_source = full_mix_wav if full_mix_wav and os.path.isfile(full_mix_wav) else vocals_wav
     print(f"Transcription source: {transcription_source}")
-    print(f"Alignment source:     {VOCALS_WAV} (clean vocals only)")
+    print(f"Alignment source:     {vocals_wav} (clean vocals only)")
 
-    # Step 1: Transcribe with Whisper large-v3
-    whisper_words, raw_text, full_result = transcribe_whisper(transcription_source, prompt=LYRICS_PROMPT)
+    staged = []   # tmpfs copies made for this song, deleted however it ends
+    try:
+        if transcription_source != vocals_wav:
+            transcription_source = stage_to_shm(transcription_source)
+            if transcription_source != full_mix_wav:
+                staged.append(transcription_source)
+        staged_vocals = stage_to_shm(vocals_wav)
+        if staged_vocals != vocals_wav:
+            staged.append(staged_vocals)
+            vocals_wav = staged_vocals
+
+        # Step 1: Transcribe with Whisper large-v3
+        whisper_words, raw_text, full_result = transcribe_whisper(
+            transcription_source, prompt=prompt, whisper_model=whisper_model
+        )
 
-    # Step 2: Refine word boundaries with ctc-forced-aligner (on clean vocals)
-    aligned_words, alignment_method = align_with_ctc(VOCALS_WAV, raw_text, whisper_words)
+        # Step 2: Refine word boundaries with ctc-forced-aligner (on clean vocals)
+        aligned_words, alignment_method = align_with_ctc(vocals_wav, raw_text, whisper_words)
+    finally:
+        for path in staged:
+            os.remove(path)
 
     # Save all outputs
-    save_outputs(OUTPUT_DIR, full_result, aligned_words, alignment_method)
+    save_outputs(output_dir, full_result, aligned_words, alignment_method)
+    return aligned_words, alignment_method
+
+
+def main(**overrides):
+    """
+    Run Stage 2 end-to-end. Keyword args override the CONFIG block by
+    lower-case name, e.g. main(vocals_wav=..., lyrics_prompt=...).
+    """
+    for key, value in overrides.items():
+        if key.upper() not in CONFIG_KEYS:
+            raise TypeError(f"main() got an unexpected keyword argument '{key}'")
+        globals()[key.upper()] = value
+    install_deps()
+
+    aligned_words, alignment_method = process(
+        VOCALS_WAV, FULL_MIX_WAV, OUTPUT_DIR, prompt=LYRICS_PROMPT,
+    )
 
     print(f"\nFirst 10 words ({alignment_method}):")
-    for w in aligned_words[:10]:
+    for w in aligned_words.to_records()[:10]:
         print(f"  {w['start']:5.2f}s -> {w['end']:5.2f}s  \"{w['word']}\"  ({w['conf']:.2f})")
     print("\nStage 2 complete. Run Stage 3 next.")
+    return aligned_words, alignment_method
+
+
+if __name__ == "__main__":
+    main()
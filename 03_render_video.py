@@ -25,10 +25,19 @@ Output:
     /kaggle/working/output/karaoke_final.mp4  (instrumental only - real karaoke)
 """
 
+from __future__ import annotations
+
+import bisect
+import functools
+import importlib.util
 import os
-import json
 import subprocess
 import sys
+from dataclasses import dataclass
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    import numpy as np
 
 # --- CONFIG -----------------------------------------------------------------------
 AUDIO_WITH_VOCALS  = "/kaggle/working/song.mp3"                    # full mix (sync check)
@@ -40,12 +49,21 @@ OUTPUT_FINAL = "/kaggle/working/output/karaoke_final.mp4"           # instrument
 SONG_TITLE   = "Somedays"
 SONG_ARTIST  = "Artist"
 
-WIDTH, HEIGHT = 1920, 1080
+WIDTH, HEIGHT = 960, 540     # render canvas: 1/4 of 1080p's pixels to composite and pipe
+OUTPUT_SIZE   = (1920, 1080) # ffmpeg lanczos-upscales the canvas to this (None = canvas size)
 FPS           = 30
-FONT_SIZE     = 96     # bigger for full-page layout
-LINE_SPACING  = 140    # vertical gap between lines
+FONT_SIZE     = 48     # bigger for full-page layout (96 on a 1080p canvas)
+SMALL_FONT_SIZE = 18   # pause countdown
+LINE_SPACING  = 70     # vertical gap between lines
 MAX_LINES     = 4      # max lines visible at once (full-page layout)
 SILENCE_GAP   = 1.5    # seconds gap = show "coming up" countdown
+RENDER_WORKERS = None  # parallel frame-range renderers (None = all cores, 1 = single pipe)
+RENDER_MODE   = "pipe" # "pipe": each worker pipes raw frames into its own ffmpeg, segments are
+                       # concatenated; "png": workers write a PNG sequence to /dev/shm, one ffmpeg encodes it
+PNG_COMPRESSION = 1    # zlib level for the PNG sequence (1 = fastest)
+NVENC_MAX_SESSIONS = 3 # consumer NVIDIA drivers cap concurrent NVENC encodes
+PILLOW_SIMD   = False  # swap Pillow for the AVX2 pillow-simd build (source build, ~1-2 min);
+                       # PIL only runs while building line tiles, so this is opt-in
 
 # Colors (RGB)
 COLOR_INACTIVE = (255, 255, 255)   # white -- upcoming
@@ -54,41 +72,171 @@ COLOR_SUNG     = (80, 80, 80)      # dim grey -- already done
 COLOR_UPCOMING = (160, 160, 180)   # blue-grey -- next line preview
 COLOR_BG       = (0, 0, 0)        # black background
 COLOR_PAUSE    = (120, 180, 255)   # light blue -- pause countdown
+LINE_COLORS    = (COLOR_INACTIVE, COLOR_ACTIVE, COLOR_SUNG, COLOR_UPCOMING)   # atlas plane order
 # ----------------------------------------------------------------------------------
+# What main(**overrides) may set. Colors are left out: LINE_COLORS is built
+# from them at import time, so overriding one would desync the atlas planes.
+CONFIG_KEYS = (
+    "AUDIO_WITH_VOCALS", "AUDIO_INSTRUMENTAL", "WORDS_JSON", "OUTPUT_DIR", "OUTPUT_VIDEO",
+    "OUTPUT_FINAL", "SONG_TITLE", "SONG_ARTIST", "WIDTH", "HEIGHT", "OUTPUT_SIZE", "FPS",
+    "FONT_SIZE", "SMALL_FONT_SIZE", "LINE_SPACING", "MAX_LINES", "SILENCE_GAP",
+    "RENDER_WORKERS", "RENDER_MODE", "PNG_COMPRESSION", "NVENC_MAX_SESSIONS", "PILLOW_SIMD",
+)
+
+
+def pip_install(*packages, check=True):
+    """Install with uv (parallel resolve/download); falls back to plain pip."""
+    if subprocess.run([sys.executable, "-m", "uv", "--version"], capture_output=True).returncode != 0:
+        subprocess.run([sys.executable, "-m", "pip", "install", "uv", "-q"], check=False)
+    r = subprocess.run(
+        [sys.executable, "-m", "uv", "pip", "install", "--python", sys.executable, "-q", *packages]
+    )
+    if r.returncode == 0:
+        return r
+    return subprocess.run([sys.executable, "-m", "pip", "install", *packages, "-q"], check=check)
+
+
+def importable(*modules):
+    """True if every module is already installed (lets install_deps skip pip entirely)."""
+    return all(importlib.util.find_spec(m) is not None for m in modules)
+
+
+def install_pillow_simd():
+    """
+    Replace stock Pillow with pillow-simd (same API, SSE4/AVX2 inner loops).
+    The wheel is built before Pillow is removed, so a failed build leaves
+    stock Pillow in place. Takes effect for PIL imports after this call.
+    """
+    import glob
+    import tempfile
+    from importlib import metadata
+
+    try:
+        metadata.version("pillow-simd")
+        return
+    except metadata.PackageNotFoundError:
+        pass
+    print("Building pillow-simd (AVX2)...")
+    with tempfile.TemporaryDirectory() as wheel_dir:
+        r = subprocess.run(
+            [sys.executable, "-m", "pip", "wheel", "-q", "--no-deps", "-w", wheel_dir, "pillow-simd"],
+            env=dict(os.environ, CC="cc -mavx2"),
+        )
+        wheels = glob.glob(os.path.join(wheel_dir, "*.whl"))
+        if r.returncode != 0 or not wheels:
+            print("WARNING: pillow-simd build failed, keeping stock Pillow")
+            return
+        subprocess.run([sys.executable, "-m", "pip", "uninstall", "-y", "-q", "pillow"], check=False)
+        subprocess.run([sys.executable, "-m", "pip", "install", "-q", wheels[0]], check=True)
+    if "PIL" in sys.modules:
+        print("  PIL was already imported: restart the runtime to use pillow-simd")
 
 
 def install_deps():
-    subprocess.run([sys.executable, "-m", "pip", "install", "Pillow", "-q"], check=True)
+    if PILLOW_SIMD:
+        install_pillow_simd()
+    if importable("PIL", "numpy", "orjson", "cv2", "soundfile", "mutagen"):
+        return
+    pip_install("Pillow", "numpy", "orjson", "opencv-python-headless", "soundfile", "mutagen")
 
 
 def load_words(path):
-    with open(path) as f:
-        return json.load(f)
+    try:
+        import orjson
+    except ImportError:
+        import json
+
+        with open(path) as f:
+            return json.load(f)
+    with open(path, "rb") as f:
+        return orjson.loads(f.read())
+
+
+@dataclass
+class WordList:
+    """
+    Word timings as struct-of-arrays (same layout as Stage 2's WordList):
+    one list of strings plus parallel float arrays, indexed by word number.
+    """
+    text: list
+    start: "np.ndarray"
+    end: "np.ndarray"
+
+    def __len__(self):
+        return len(self.text)
+
+    @classmethod
+    def from_records(cls, records):
+        """Build from words.json dicts, dropping words with no visible text."""
+        import numpy as np
+
+        records = [w for w in records if w["word"].strip()]
+        return cls(
+            [w["word"].strip() for w in records],
+            np.fromiter((w["start"] for w in records), float, len(records)),
+            np.fromiter((w["end"] for w in records), float, len(records)),
+        )
 
 
 def segment_lines(words, max_chars=32, max_words=6):
     """
-    Group words into display lines.
-    Smaller max_chars/max_words than before since font is bigger.
+    Group words into display lines, returned as (first, last + 1) word-index
+    ranges into `words`. Smaller max_chars/max_words than before since font is bigger.
     """
-    lines, current, chars = [], [], 0
-    for word in words:
-        wt = word["word"].strip()
-        if not wt:
-            continue
-        projected = chars + len(wt) + (1 if current else 0)
-        if current and (projected > max_chars or len(current) >= max_words):
-            lines.append(current)
-            current, chars = [word], len(wt)
+    lines, line_start, chars = [], 0, 0
+    for i, wt in enumerate(words.text):
+        projected = chars + len(wt) + (1 if i > line_start else 0)
+        if i > line_start and (projected > max_chars or i - line_start >= max_words):
+            lines.append((line_start, i))
+            line_start, chars = i, len(wt)
         else:
-            current.append(word)
             chars = projected
-    if current:
-        lines.append(current)
+    if len(words) > line_start:
+        lines.append((line_start, len(words)))
     return lines
 
 
+@functools.lru_cache(maxsize=1)
+def nvenc_available():
+    """True if this ffmpeg build can actually open h264_nvenc (needs an NVIDIA GPU)."""
+    r = subprocess.run(
+        ["ffmpeg", "-hide_banner", "-v", "error",
+         "-f", "lavfi", "-i", "color=black:s=256x256", "-frames:v", "1",
+         "-c:v", "h264_nvenc", "-f", "null", "-"],
+        capture_output=True
+    )
+    return r.returncode == 0
+
+
+def scale_args():
+    """ffmpeg filter upscaling the rendered canvas to OUTPUT_SIZE (lanczos), if they differ."""
+    if not OUTPUT_SIZE or tuple(OUTPUT_SIZE) == (WIDTH, HEIGHT):
+        return []
+    return ["-vf", f"scale={OUTPUT_SIZE[0]}:{OUTPUT_SIZE[1]}:flags=lanczos"]
+
+
+def video_codec_args():
+    """Encode on the GPU (NVENC) when available, else CPU libx264."""
+    if nvenc_available():
+        return ["-c:v", "h264_nvenc", "-preset", "p4", "-rc", "vbr", "-cq", "20"]
+    return ["-c:v", "libx264", "-preset", "fast", "-crf", "18"]
+
+
 def get_audio_duration(audio_file):
+    """
+    Duration in seconds from the file header: libsndfile (WAV/FLAC/MP3), then
+    mutagen (M4A/AAC/...), and ffprobe only if neither can read it.
+    """
+    try:
+        import soundfile as sf
+        return sf.info(audio_file).duration
+    except Exception:
+        pass
+    try:
+        from mutagen import File
+        return File(audio_file).info.length
+    except Exception:
+        pass
     r = subprocess.run(
         ["ffprobe", "-v", "error", "-show_entries", "format=duration",
          "-of", "default=noprint_wrappers=1:nokey=1", audio_file],
@@ -97,118 +245,398 @@ def get_audio_duration(audio_file):
     return float(r.stdout.strip())
 
 
-def measure_line_width(draw, line, font):
-    """Return total pixel width of a line of words."""
-    total = 0
-    for w in line:
-        txt = w["word"].strip() + " "
-        bbox = draw.textbbox((0, 0), txt, font=font)
-        total += bbox[2] - bbox[0]
-    return total
-
-
-def render_frame(draw, img_w, img_h, lines, active_line_idx, t, font, font_small):
+def build_line_tiles(words, lines, font):
+    """
+    Pre-render every line once per color into one uint8 NumPy atlas, so the
+    frame loop only copies pixels instead of calling PIL per word per frame.
+    Words are measured and drawn once per line; the colors are tints of that mask.
+    Returns (line_tiles, atlas): atlas is (len(LINE_COLORS), h, total_w, 3) with
+    the lines side by side; one dict per line: {"x": left edge on screen,
+    "off": column in the atlas, "w": tile width, "words": [(x_in_tile, pixel_width), ...],
+    "pw": pixel widths as an array}.
+    """
+    import numpy as np
+    from PIL import Image, ImageDraw
+
+    ascent, descent = font.getmetrics()
+    tile_h = ascent + descent
+    measure = ImageDraw.Draw(Image.new("RGB", (1, 1)))
+
+    line_tiles, masks, off = [], [], 0
+    for i0, i1 in lines:
+        line = words.text[i0:i1]
+        word_x, x = [], 0
+        for wt in line:
+            bbox = measure.textbbox((0, 0), wt + " ", font=font)
+            pw = bbox[2] - bbox[0]
+            word_x.append((x, pw))
+            x += pw
+        tile_w = x + FONT_SIZE // 2   # slack for glyph overhang past the advance width
+
+        # Rasterize the glyph coverage once; tinted per color below
+        mask_img = Image.new("L", (tile_w, tile_h), 0)
+        draw = ImageDraw.Draw(mask_img)
+        for wt, (wx, _) in zip(line, word_x):
+            draw.text((wx, 0), wt + " ", font=font, fill=255)
+        masks.append(np.asarray(mask_img))
+        line_tiles.append({"x": (WIDTH - x) // 2, "off": off, "w": tile_w, "words": word_x,
+                           "pw": np.array([pw for _, pw in word_x], float)})
+        off += tile_w
+
+    cover = np.concatenate(masks, axis=1).astype(np.float32)[..., None] / 255.0 if masks \
+        else np.zeros((tile_h, 0, 1), np.float32)
+    bg = np.array(COLOR_BG, np.float32)
+    atlas = np.stack([
+        (bg + (np.array(color, np.float32) - bg) * cover + 0.5).astype(np.uint8)
+        for color in LINE_COLORS
+    ])
+    return line_tiles, atlas
+
+
+_TEXT_TILES = {}
+
+
+def text_tile(text, font, color):
+    """Render a standalone string (countdown, title card) once and cache the tile."""
+    key = (text, id(font), color)
+    if key not in _TEXT_TILES:
+        import numpy as np
+        from PIL import Image, ImageDraw
+
+        bbox = ImageDraw.Draw(Image.new("RGB", (1, 1))).textbbox((0, 0), text, font=font)
+        img = Image.new("RGB", (bbox[2], bbox[3]), COLOR_BG)
+        ImageDraw.Draw(img).text((0, 0), text, font=font, fill=color)
+        _TEXT_TILES[key] = np.asarray(img)
+    return _TEXT_TILES[key]
+
+
+def blit(frame, tile, x, y, x0=0, x1=None):
+    """Copy tile columns [x0, x1) into frame with the tile's origin at (x, y), clipped to the frame."""
+    h, w = tile.shape[:2]
+    x1 = w if x1 is None else min(x1, w)
+    fx0, fx1 = max(x + x0, 0), min(x + x1, frame.shape[1])
+    fy0, fy1 = max(y, 0), min(y + h, frame.shape[0])
+    if fx0 < fx1 and fy0 < fy1:
+        frame[fy0:fy1, fx0:fx1] = tile[fy0 - y:fy1 - y, fx0 - x:fx1 - x]
+
+
+def render_frame(frame, atlas, line_tiles, active_line_idx, fills=None):
     """
-    Render one frame with full-page layout:
+    Composite one frame (HxWx3 uint8, already cleared) with full-page layout:
     - Up to MAX_LINES lines visible
-    - Active line highlighted with progressive fill
+    - Active line highlighted with progressive (pixel-exact) fill
     - Next line shown in upcoming color below
     - Already-sung lines shown in dim grey
+    fills: word_fill() of the active line.
     """
     # Center the visible block vertically
-    num_visible = min(MAX_LINES, len(lines))
+    num_visible = min(MAX_LINES, len(line_tiles))
     total_block_h = num_visible * LINE_SPACING
-    y_start = (img_h - total_block_h) // 2
+    y_start = (HEIGHT - total_block_h) // 2
 
     # Determine which lines to show: center active line in view
     if active_line_idx is None:
         # No active line (silence) - show upcoming lines preview
-        start_idx = 0
-        show_lines = lines[:num_visible]
+        start_idx, end_idx = 0, num_visible
     else:
         # Try to center active line
         half = num_visible // 2
         start_idx = max(0, active_line_idx - half)
         end_idx = start_idx + num_visible
-        if end_idx > len(lines):
-            end_idx = len(lines)
+        if end_idx > len(line_tiles):
+            end_idx = len(line_tiles)
             start_idx = max(0, end_idx - num_visible)
-        show_lines = lines[start_idx:end_idx]
-
-    for li, line in enumerate(show_lines):
-        line_idx = start_idx + li
-        y = y_start + li * LINE_SPACING
-
-        # Measure line for centering
-        total_w = 0
-        word_widths = []
-        for w in line:
-            txt = w["word"].strip() + " "
-            bbox = draw.textbbox((0, 0), txt, font=font)
-            pw = bbox[2] - bbox[0]
-            word_widths.append((w, txt, pw))
-            total_w += pw
-        x = (img_w - total_w) // 2
-
-        for w, txt, pw in word_widths:
-            if active_line_idx is None:
-                # Silence period — show all as upcoming
-                color = COLOR_UPCOMING
-                draw.text((x, y), txt, font=font, fill=color)
-            elif line_idx < active_line_idx:
-                # Already sung line
-                draw.text((x, y), txt, font=font, fill=COLOR_SUNG)
-            elif line_idx > active_line_idx:
-                # Upcoming line
-                draw.text((x, y), txt, font=font, fill=COLOR_UPCOMING)
-            else:
-                # Active line — word-by-word progressive fill
-                if w["end"] <= t:
-                    color = COLOR_SUNG
-                    draw.text((x, y), txt, font=font, fill=color)
-                elif w["start"] <= t < w["end"]:
+
+    # Collect the copies as (plane, atlas_x0, atlas_x1, frame_x, frame_y) spans
+    spans = []
+
+    def put(color, x0=0, x1=None):
+        x1 = lt["w"] if x1 is None else x1
+        if x0 < x1:
+            spans.append((LINE_COLORS.index(color), lt["off"] + x0, lt["off"] + x1, lt["x"] + x0, y))
+
+    for line_idx in range(start_idx, end_idx):
+        lt = line_tiles[line_idx]
+        y = y_start + (line_idx - start_idx) * LINE_SPACING
+
+        if active_line_idx is None or line_idx > active_line_idx:
+            # Silence preview / upcoming line
+            put(COLOR_UPCOMING)
+        elif line_idx < active_line_idx:
+            # Already sung line
+            put(COLOR_SUNG)
+        else:
+            # Active line — word-by-word progressive fill
+            last = len(lt["words"]) - 1
+            for wi, ((wx, pw), fill) in enumerate(zip(lt["words"], fills)):
+                wend = None if wi == last else wx + pw   # last word keeps the overhang slack
+                if fill == FILL_SUNG:
+                    put(COLOR_SUNG, wx, wend)
+                elif fill >= 0:
                     # Progressive yellow fill left-to-right
-                    frac = (t - w["start"]) / max(w["end"] - w["start"], 0.01)
-                    frac = min(1.0, frac)
-                    fill_px = int(pw * frac)
-
-                    # Draw white base (full word)
-                    draw.text((x, y), txt, font=font, fill=COLOR_INACTIVE)
-                    # Clip yellow fill over it using a temporary image
-                    # We use a simple approach: draw yellow on a separate pass
-                    # by rendering the text twice and masking — but PIL doesn't support
-                    # proper clipping, so we use a character-width approximation:
-                    # Render each character progressively
-                    cx = x
-                    for ch in txt:
-                        ch_bbox = draw.textbbox((0, 0), ch, font=font)
-                        ch_w = ch_bbox[2] - ch_bbox[0]
-                        if cx + ch_w // 2 <= x + fill_px:
-                            draw.text((cx, y), ch, font=font, fill=COLOR_ACTIVE)
-                        else:
-                            draw.text((cx, y), ch, font=font, fill=COLOR_INACTIVE)
-                        cx += ch_w
+                    put(COLOR_ACTIVE, wx, wx + fill)
+                    put(COLOR_INACTIVE, wx + fill, wend)
                 else:
-                    draw.text((x, y), txt, font=font, fill=COLOR_INACTIVE)
-            x += pw
+                    put(COLOR_INACTIVE, wx, wend)
+    composite(frame, atlas, spans)
+
+
+def composite(frame, atlas, spans):
+    """Copy atlas spans (plane, atlas_x0, atlas_x1, frame_x, frame_y) into frame."""
+    for p, sx0, sx1, dx, dy in spans:
+        blit(frame, atlas[p], dx - sx0, dy, sx0, sx1)
+
+
+FILL_SUNG, FILL_UPCOMING = -1, -2
+
+
+def word_fill(words, line, line_tile, t):
+    """
+    Per-word state of the active line at time t: FILL_SUNG, FILL_UPCOMING, or
+    the number of yellow pixels of the word being sung, computed over the
+    line's slice of the start/end arrays. Equal tuples mean identical pixels,
+    so the render loop also uses this as a frame-change key.
+    """
+    import numpy as np
+
+    start, end = words.start[line[0]:line[1]], words.end[line[0]:line[1]]
+    frac = np.minimum((t - start) / np.maximum(end - start, 0.01), 1.0)
+    fills = (line_tile["pw"] * frac).astype(np.int64)
+    fills[start > t] = FILL_UPCOMING
+    fills[end <= t] = FILL_SUNG
+    return tuple(fills.tolist())
 
 
-def get_active_line_for_time(lines, t):
+def line_timeline(words, lines):
+    """
+    Per-line start times and end times (+0.1s hold), built once so the frame
+    loop can bisect instead of scanning every line.
+    """
+    first = [i0 for i0, _ in lines]
+    last = [i1 - 1 for _, i1 in lines]
+    return words.start[first].tolist(), (words.end[last] + 0.1).tolist()
+
+
+def get_active_line_for_time(timeline, t):
     """Return (line_idx, is_silence, seconds_to_next) for time t."""
-    for li, line in enumerate(lines):
-        flat_start = line[0]["start"]
-        flat_end = line[-1]["end"]
-        if flat_start <= t <= flat_end + 0.1:
-            return li, False, 0
-    # In a gap — find next line
-    for li, line in enumerate(lines):
-        if line[0]["start"] > t:
-            return None, True, line[0]["start"] - t
-    return None, True, 0
+    starts, ends = timeline
+    li = bisect.bisect_left(ends, t)   # first line not yet finished
+    if li == len(ends):
+        return None, True, 0
+    if starts[li] <= t:
+        return li, False, 0
+    # In a gap — li is the next line
+    return None, True, starts[li] - t
+
+
+def iter_frames(scene, fn0, fn1):
+    """
+    Composite frames [fn0, fn1) of the scene. Yields (fn, frame, changed):
+    frame is one reused HxWx3 RGB buffer; changed=False means nothing visible
+    moved since the previous frame, so callers can reuse what they encoded last.
+    """
+    import numpy as np
+
+    words, lines = scene["words"], scene["lines"]
+    line_tiles, timeline = scene["line_tiles"], scene["timeline"]
+    atlas = scene["atlas"]
+    font_small, title_tile = scene["font_small"], scene["title_tile"]
+    total_frames = scene["total_frames"]
+
+    frame = np.empty((HEIGHT, WIDTH, 3), np.uint8)
+    last_key = None
+    for fn in range(fn0, fn1):
+        t = fn / FPS
+        line_idx, is_silence, time_to_next = get_active_line_for_time(timeline, t)
+
+        # What's visible this frame; only composite when it differs from the last one
+        if is_silence and time_to_next > 0:
+            countdown_txt = None
+            if time_to_next > 0.3:
+                countdown_txt = f"vocals in {time_to_next:.1f}s" if time_to_next > 2 else "..."
+            key = ("pause", countdown_txt)
+        elif line_idx is not None:
+            fills = word_fill(words, lines[line_idx], line_tiles[line_idx], t)
+            key = ("line", line_idx, fills)
+        else:
+            key = ("title",)
+
+        changed = key != last_key
+        if changed:
+            frame[:] = COLOR_BG
+            if key[0] == "pause":
+                # Show next-up line preview + countdown
+                render_frame(frame, atlas, line_tiles, None)
+                if countdown_txt:
+                    tile = text_tile(countdown_txt, font_small, COLOR_PAUSE)
+                    blit(frame, tile, (WIDTH - tile.shape[1]) // 2, HEIGHT - HEIGHT // 13)
+            elif key[0] == "line":
+                render_frame(frame, atlas, line_tiles, line_idx, fills)
+            else:
+                # After last word
+                blit(frame, title_tile, (WIDTH - title_tile.shape[1]) // 2, HEIGHT//2 - FONT_SIZE//2)
+            last_key = key
+        yield fn, frame, changed
+
+        if key == ("title",):
+            # Title card runs to the end: no per-frame work for the outro
+            for rest in range(fn + 1, fn1):
+                yield rest, frame, False
+            return
+        if fn % (FPS * 15) == 0:
+            print(f"  {fn/total_frames*100:.0f}%  t={t:.0f}s")
+
+
+def render_frames(scene, fn0, fn1, output_path, audio_file=None):
+    """
+    Render frames [fn0, fn1) of the scene and encode them to output_path.
+    Frames go down the pipe as YUV420 (1.5 bytes/px vs 3 for RGB). Audio is
+    muxed in only when audio_file is given (single-process render).
+    """
+    import cv2
+
+    audio_in = ["-i", audio_file] if audio_file else []
+    audio_out = ["-c:a", "aac", "-b:a", "192k", "-shortest"] if audio_file else ["-an"]
+    cmd = [
+        "ffmpeg", "-y",
+        "-f", "rawvideo", "-vcodec", "rawvideo",
+        "-s", f"{WIDTH}x{HEIGHT}", "-pix_fmt", "yuv420p", "-r", str(FPS),
+        "-i", "pipe:0",
+        *audio_in,
+        *scale_args(), *video_codec_args(), "-pix_fmt", "yuv420p",
+        *audio_out,
+        output_path
+    ]
+    proc = subprocess.Popen(cmd, stdin=subprocess.PIPE)
+
+    last_bytes = None
+    for _, frame, changed in iter_frames(scene, fn0, fn1):
+        if changed:
+            last_bytes = cv2.cvtColor(frame, cv2.COLOR_RGB2YUV_I420).tobytes()
+        proc.stdin.write(last_bytes)
+
+    proc.stdin.close()
+    proc.wait()
+    if proc.returncode != 0:
+        raise RuntimeError(f"ffmpeg render failed: {output_path}")
+
+
+def write_png_frames(scene, fn0, fn1, frames_dir):
+    """
+    Write frames [fn0, fn1) as frames_dir/%06d.png. Repeated frames are hard
+    links to the previous file, so they cost neither an encode nor space.
+    """
+    import cv2
+
+    last_path = None
+    for fn, frame, changed in iter_frames(scene, fn0, fn1):
+        path = os.path.join(frames_dir, f"{fn:06d}.png")
+        if changed:
+            bgr = cv2.cvtColor(frame, cv2.COLOR_RGB2BGR)
+            if not cv2.imwrite(path, bgr, [cv2.IMWRITE_PNG_COMPRESSION, PNG_COMPRESSION]):
+                raise RuntimeError(f"could not write {path}")
+            last_path = path
+        else:
+            os.link(last_path, path)
+
+
+def run_workers(target, args_list):
+    """
+    Run target(*args) for each args tuple in its own forked process and wait
+    for all of them. Forked Processes rather than a Pool: the scene (tiles,
+    atlas, fonts) is inherited copy-on-write instead of pickled per task.
+    """
+    import multiprocessing as mp
+
+    if len(args_list) == 1:
+        target(*args_list[0])
+        return
+    ctx = mp.get_context("fork")
+    procs = [ctx.Process(target=target, args=args) for args in args_list]
+    for p in procs:
+        p.start()
+    for p in procs:
+        p.join()
+    failed = [i for i, p in enumerate(procs) if p.exitcode != 0]
+    if failed:
+        raise RuntimeError(f"render chunk(s) failed: {failed}")
+
+
+def frame_bounds(total_frames, workers):
+    """One contiguous [fn0, fn1) range per worker."""
+    bounds = [total_frames * i // workers for i in range(workers + 1)]
+    return list(zip(bounds[:-1], bounds[1:]))
+
+
+def render_parallel(scene, workers, audio_file, output_video):
+    """
+    Encode one contiguous frame range per worker to its own segment, then
+    concat the segments (stream copy) and mux the audio once.
+    """
+    import shutil
+    import tempfile
+
+    total_frames = scene["total_frames"]
+    tmpdir = tempfile.mkdtemp(prefix=".segments_", dir=OUTPUT_DIR)
+    try:
+        segments = [os.path.join(tmpdir, f"seg_{i:03d}.mp4") for i in range(workers)]
+        print(f"Rendering {total_frames} frames in {workers} parallel chunks")
+        run_workers(render_frames, [
+            (scene, fn0, fn1, seg) for (fn0, fn1), seg in zip(frame_bounds(total_frames, workers), segments)
+        ])
+
+        concat_list = os.path.join(tmpdir, "segments.txt")
+        with open(concat_list, "w") as f:
+            f.writelines(f"file '{seg}'\n" for seg in segments)
+        r = subprocess.run([
+            "ffmpeg", "-y", "-loglevel", "error",
+            "-f", "concat", "-safe", "0", "-i", concat_list,
+            "-i", audio_file,
+            "-map", "0:v", "-map", "1:a",
+            "-c:v", "copy", "-c:a", "aac", "-b:a", "192k", "-shortest",
+            output_video
+        ])
+        if r.returncode != 0:
+            raise RuntimeError("ffmpeg segment concat failed")
+    finally:
+        shutil.rmtree(tmpdir, ignore_errors=True)
+
+
+def render_png_sequence(scene, workers, audio_file, output_video):
+    """
+    Write the frames as a PNG sequence from all workers in parallel (tmpfs when
+    it has room), then encode it with a single ffmpeg reading the files.
+    """
+    import shutil
+    import tempfile
+
+    total_frames = scene["total_frames"]
+    # Text-on-black canvas PNGs are ~10-60 KB; repeats are hard links
+    tmp_root = "/dev/shm"
+    if not os.path.isdir(tmp_root) or shutil.disk_usage(tmp_root).free < total_frames * 64_000:
+        tmp_root = OUTPUT_DIR
+    frames_dir = tempfile.mkdtemp(prefix=".frames_", dir=tmp_root)
+    try:
+        print(f"Writing {total_frames} PNG frames to {frames_dir} ({workers} workers)")
+        run_workers(write_png_frames, [
+            (scene, fn0, fn1, frames_dir) for fn0, fn1 in frame_bounds(total_frames, workers)
+        ])
+        r = subprocess.run([
+            "ffmpeg", "-y", "-loglevel", "error",
+            "-framerate", str(FPS), "-i", os.path.join(frames_dir, "%06d.png"),
+            "-i", audio_file,
+            *scale_args(), *video_codec_args(), "-pix_fmt", "yuv420p",
+            "-c:a", "aac", "-b:a", "192k", "-shortest",
+            output_video
+        ])
+        if r.returncode != 0:
+            raise RuntimeError("ffmpeg PNG sequence encode failed")
+    finally:
+        shutil.rmtree(frames_dir, ignore_errors=True)
 
 
 def render_video(words, audio_file, output_video):
-    from PIL import Image, ImageDraw, ImageFont
+    from PIL import ImageFont
 
     os.makedirs(OUTPUT_DIR, exist_ok=True)
     duration = get_audio_duration(audio_file)
@@ -225,7 +653,7 @@ def render_video(words, audio_file, output_video):
     ]:
         if os.path.isfile(fp):
             font = ImageFont.truetype(fp, FONT_SIZE)
-            font_small = ImageFont.truetype(fp, 36)
+            font_small = ImageFont.truetype(fp, SMALL_FONT_SIZE)
             print(f"Font: {fp}")
             break
     if not font:
@@ -235,62 +663,42 @@ def render_video(words, audio_file, output_video):
 
     lines = segment_lines(words)
     print(f"{len(words)} words -> {len(lines)} lines")
-
-    # Pipe raw frames into ffmpeg
-    cmd = [
-        "ffmpeg", "-y",
-        "-f", "rawvideo", "-vcodec", "rawvideo",
-        "-s", f"{WIDTH}x{HEIGHT}", "-pix_fmt", "rgb24", "-r", str(FPS),
-        "-i", "pipe:0",
-        "-i", audio_file,
-        "-c:v", "libx264", "-preset", "fast", "-crf", "18",
-        "-c:a", "aac", "-b:a", "192k", "-shortest",
-        output_video
-    ]
-    proc = subprocess.Popen(cmd, stdin=subprocess.PIPE)
-
-    for fn in range(total_frames):
-        t = fn / FPS
-        img = Image.new("RGB", (WIDTH, HEIGHT), COLOR_BG)
-        draw = ImageDraw.Draw(img)
-
-        line_idx, is_silence, time_to_next = get_active_line_for_time(lines, t)
-
-        if is_silence and time_to_next > 0:
-            # Show next-up line preview + countdown
-            render_frame(draw, WIDTH, HEIGHT, lines, None, t, font, font_small)
-            # Countdown
-            if time_to_next > 0.3:
-                countdown_txt = f"vocals in {time_to_next:.1f}s" if time_to_next > 2 else "..."
-                bbox = draw.textbbox((0, 0), countdown_txt, font=font_small)
-                cx = (WIDTH - (bbox[2] - bbox[0])) // 2
-                draw.text((cx, HEIGHT - 80), countdown_txt, font=font_small, fill=COLOR_PAUSE)
-        elif line_idx is not None:
-            render_frame(draw, WIDTH, HEIGHT, lines, line_idx, t, font, font_small)
-        else:
-            # Before first word or after last word
-            draw.text((WIDTH//2 - 300, HEIGHT//2 - FONT_SIZE//2),
-                      f"{SONG_ARTIST} -- {SONG_TITLE}", font=font, fill=COLOR_INACTIVE)
-
-        proc.stdin.write(img.tobytes())
-        if fn % (FPS * 15) == 0:
-            print(f"  {fn/total_frames*100:.0f}%  t={t:.0f}s")
-
-    proc.stdin.close()
-    proc.wait()
-    if proc.returncode != 0:
-        raise RuntimeError("ffmpeg render failed")
+    line_tiles, atlas = build_line_tiles(words, lines, font)
+    timeline = line_timeline(words, lines)
+    title_tile = text_tile(f"{SONG_ARTIST} -- {SONG_TITLE}", font, COLOR_INACTIVE)
+
+    scene = dict(words=words, lines=lines, line_tiles=line_tiles, atlas=atlas, timeline=timeline,
+                 font_small=font_small, title_tile=title_tile, total_frames=total_frames)
+
+    workers = RENDER_WORKERS or os.cpu_count() or 1
+    if RENDER_MODE == "pipe" and nvenc_available():
+        workers = min(workers, NVENC_MAX_SESSIONS)   # one encode session per worker
+    workers = max(1, min(workers, total_frames // (FPS * 10)))   # >= 10s per chunk
+    if RENDER_MODE == "png":
+        render_png_sequence(scene, workers, audio_file, output_video)
+    elif workers == 1:
+        render_frames(scene, 0, total_frames, output_video, audio_file)
+    else:
+        render_parallel(scene, workers, audio_file, output_video)
 
     mb = os.path.getsize(output_video) / 1e6
     print(f"\nVideo done: {output_video} ({mb:.1f} MB)")
 
 
-if __name__ == "__main__":
+def main(**overrides):
+    """
+    Run Stage 3 end-to-end. Keyword args override the CONFIG block by
+    lower-case name, e.g. main(words_json=..., song_title="...").
+    """
+    for key, value in overrides.items():
+        if key.upper() not in CONFIG_KEYS:
+            raise TypeError(f"main() got an unexpected keyword argument '{key}'")
+        globals()[key.upper()] = value
     install_deps()
     if not os.path.isfile(WORDS_JSON):
         raise FileNotFoundError(f"words.json missing: {WORDS_JSON} -- run Stage 2 first")
 
-    words = load_words(WORDS_JSON)
+    words = WordList.from_records(load_words(WORDS_JSON))
 
     # Render WITH vocals (for sync verification)
     audio_src = AUDIO_WITH_VOCALS if os.path.isfile(AUDIO_WITH_VOCALS) else AUDIO_INSTRUMENTAL
@@ -305,3 +713,7 @@ if __name__ == "__main__":
     print("\nStage 3 complete.")
     print(f"  Sync check (with vocals): {OUTPUT_VIDEO}")
     print(f"  Karaoke (instrumental):   {OUTPUT_FINAL}")
+
+
+if __name__ == "__main__":
+    main()
@@ -11,10 +11,12 @@ Steps:
 
 Requirements (Colab GPU runtime):
   - !apt-get install -y ffmpeg
-  - !pip install demucs whisper-timestamped openai-whisper Pillow
+  - !pip install demucs faster-whisper orjson Pillow
+  - !pip install git+https://github.com/MahmoudAshraf97/ctc-forced-aligner.git
+    (whisper-timestamped is only needed as Stage 2's fallback transcriber)
 """
 
-import subprocess, sys, os, json
+import subprocess, sys, os, threading, importlib
 
 # --- CONFIG -------------------------------------------------
 INPUT_FILE    = "/content/your_song.mp3"   # <-- upload and set this
@@ -22,8 +24,15 @@ SONG_ARTIST   = "Artist Name"
 SONG_TITLE    = "Song Title"
 OUTPUT_DIR    = "/content/output"
 LYRICS_PROMPT = ""   # Optional: paste full lyrics for best accuracy
+CACHE_DIR     = "/content/.cache"   # model weights (shared with Stage 2)
 # ------------------------------------------------------------
 
+# Stage 2 honours these (os.environ.setdefault), so the prefetch below and
+# faster-whisper resolve the same HF cache
+os.environ.setdefault("HF_HOME", os.path.join(CACHE_DIR, "hf"))
+os.environ.setdefault("TORCH_HOME", os.path.join(CACHE_DIR, "torch"))
+os.environ.setdefault("XDG_CACHE_HOME", CACHE_DIR)
+
 REPO_URL   = "https://github.com/zackrandall21-creator/karaoke-pipeline"
 REPO_LOCAL = "/content/karaoke-pipeline"
 
@@ -36,47 +45,47 @@ else:
 sys.path.insert(0, REPO_LOCAL)
 print(f"Pulled pipeline scripts from {REPO_URL}")
 
-# Helper: exec a stage script with variable overrides
-def run_stage(script_name, overrides=None):
-    path = os.path.join(REPO_LOCAL, script_name)
-    with open(path) as f:
-        src = f.read()
-    ns = dict(__name__="__main__")
-    if overrides:
-        ns.update(overrides)
-    exec(compile(src, path, "exec"), ns)
-    return ns
+# Stages are imported (not exec'd): each module -- and Stage 2's Whisper/aligner
+# model cache -- persists, so re-running this cell for another song skips
+# recompiling the scripts, the pip checks and the model loads
+stage1 = importlib.import_module("01_demucs_separate")
+stage2 = importlib.import_module("02_whisper_transcribe")
+stage3 = importlib.import_module("03_render_video")
+
+# Download Whisper weights (~3GB, network-bound) while Stage 1 runs on the GPU
+stage2.CACHE_DIR = CACHE_DIR
+threading.Thread(target=stage2.prefetch_whisper, daemon=True).start()
 
 # Stage 1: Vocal Separation
 print("\n" + "="*50)
 print("STAGE 1: Vocal Separation")
 print("="*50)
-run_stage("01_demucs_separate.py", {
-    "INPUT_FILE": INPUT_FILE,
-    "OUTPUT_DIR": OUTPUT_DIR,
-})
+stage1.main(input_file=INPUT_FILE, output_dir=OUTPUT_DIR)
 
 # Stage 2: Whisper Transcription
 print("\n" + "="*50)
 print("STAGE 2: Whisper Transcription")
 print("="*50)
-run_stage("02_whisper_transcribe.py", {
-    "VOCALS_WAV":    os.path.join(OUTPUT_DIR, "vocals.wav"),
-    "OUTPUT_DIR":    OUTPUT_DIR,
-    "LYRICS_PROMPT": LYRICS_PROMPT,
-})
+stage2.main(
+    vocals_wav=os.path.join(OUTPUT_DIR, "vocals.wav"),
+    full_mix_wav=INPUT_FILE,
+    output_dir=OUTPUT_DIR,
+    lyrics_prompt=LYRICS_PROMPT,
+    cache_dir=CACHE_DIR,
+)
 
 # Stage 3: Render Video
 print("\n" + "="*50)
 print("STAGE 3: Video Render")
 print("="*50)
-run_stage("03_render_video.py", {
-    "AUDIO_FILE":   os.path.join(OUTPUT_DIR, "no_vocals.wav"),
-    "WORDS_JSON":   os.path.join(OUTPUT_DIR, "words.json"),
-    "OUTPUT_DIR":   OUTPUT_DIR,
-    "OUTPUT_VIDEO": os.path.join(OUTPUT_DIR, "karaoke_video.mp4"),
-    "SONG_TITLE":   SONG_TITLE,
-    "SONG_ARTIST":  SONG_ARTIST,
-})
+stage3.main(
+    audio_with_vocals="",   # instrumental-only render
+    audio_instrumental=os.path.join(OUTPUT_DIR, "no_vocals.wav"),
+    words_json=os.path.join(OUTPUT_DIR, "words.json"),
+    output_dir=OUTPUT_DIR,
+    output_video=os.path.join(OUTPUT_DIR, "karaoke_video.mp4"),
+    song_title=SONG_TITLE,
+    song_artist=SONG_ARTIST,
+)
 
 print("\nAll done! Download: /content/output/karaoke_video.mp4")
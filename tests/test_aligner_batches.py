@@ -0,0 +1,64 @@
+"""
+Stage 2 aligner: a compiled model must give the same emissions as eager when
+generate_emissions() splits a song into several batches.
+"""
+
+import importlib.util
+import os
+import sys
+
+import pytest
+
+torch = pytest.importorskip("torch")
+pytest.importorskip("ctc_forced_aligner")
+modeling_outputs = pytest.importorskip("transformers.modeling_outputs")
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture(scope="module")
+def stage2():
+    spec = importlib.util.spec_from_file_location(
+        "whisper_transcribe", os.path.join(ROOT, "02_whisper_transcribe.py")
+    )
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[spec.name] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+class TinyCTC(torch.nn.Module):
+    """Stand-in for MMS-300M: 20ms frames (stride 320) -> logits, returned like Wav2Vec2ForCTC."""
+
+    def __init__(self, vocab=8):
+        super().__init__()
+        self.conv = torch.nn.Conv1d(1, vocab, kernel_size=400, stride=320)
+
+    @property
+    def dtype(self):
+        return self.conv.weight.dtype
+
+    def forward(self, input_values):
+        logits = self.conv(input_values.unsqueeze(1)).transpose(1, 2)
+        return modeling_outputs.CausalLMOutput(logits=logits)
+
+
+DEVICES = ["cpu"] + (["cuda"] if torch.cuda.is_available() else [])
+
+
+@pytest.mark.parametrize("batch_size", [1, 3])   # 3: a full batch, then a partial one
+@pytest.mark.parametrize("device", DEVICES)
+def test_compiled_aligner_multi_batch(stage2, device, batch_size):
+    from ctc_forced_aligner import generate_emissions
+
+    torch.manual_seed(0)
+    model = TinyCTC().to(device).eval()
+    compiled = stage2._compile_aligner(model, device)
+    assert compiled is not model, "torch.compile fell back to eager"
+
+    audio = torch.randn(3 * 30 * 16000 + 5 * 16000, device=device)   # 4 windows
+    with torch.inference_mode():
+        expected, stride = generate_emissions(model, audio, batch_size=batch_size)
+        got, got_stride = generate_emissions(compiled, audio, batch_size=batch_size)
+    assert got_stride == stride
+    torch.testing.assert_close(got, expected, rtol=1e-4, atol=1e-4)
@@ -0,0 +1,64 @@
+"""
+Stage 1: the batched Roformer demix must return both stems for single-target
+checkpoints, the way audio-separator's MDXCSeparator.demix does.
+"""
+
+import importlib.util
+import os
+import sys
+from types import SimpleNamespace
+
+import pytest
+
+np = pytest.importorskip("numpy")
+torch = pytest.importorskip("torch")
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture(scope="module")
+def stage1():
+    spec = importlib.util.spec_from_file_location(
+        "demucs_separate", os.path.join(ROOT, "01_demucs_separate.py")
+    )
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[spec.name] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+def _fake_single_target_separator():
+    """Stand-in for a loaded ViperX ep_317: one target stem, model output drops the stem axis."""
+    cfg = SimpleNamespace(
+        training=SimpleNamespace(instruments=["vocals", "other"], target_instrument="vocals"),
+        inference=SimpleNamespace(dim_t=11),
+        model=SimpleNamespace(stft_hop_length=64),
+        audio=SimpleNamespace(hop_length=64),
+    )
+    inst = SimpleNamespace(
+        is_roformer=True,
+        model_run=lambda x: x * 0.5,
+        model_data_cfgdict=cfg,
+        demix=None,
+        pitch_shift=0,
+        segment_size=256,
+        override_model_segment_size=False,
+        torch_device="cpu",
+        primary_stem_name="vocals",
+        secondary_stem_name="other",
+    )
+    return SimpleNamespace(model_instance=inst)
+
+
+def test_single_target_demix_returns_both_stems(stage1):
+    sep = _fake_single_target_separator()
+    assert stage1._patch_batched_roformer(sep, autocast=False)
+
+    mix = np.random.default_rng(0).standard_normal((2, 3000)).astype(np.float32)
+    sources = sep.model_instance.demix(mix)
+
+    assert set(sources) == {"vocals", "other"}
+    for stem in sources.values():
+        assert stem.shape == mix.shape
+    np.testing.assert_allclose(sources["vocals"], mix * 0.5, atol=1e-5)
+    np.testing.assert_allclose(sources["other"], mix - sources["vocals"], atol=1e-6)